@@ -0,0 +1,28 @@
+from enum import Enum
+
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_ecs as ecs
+from aws_cdk.aws_ecr_assets import Platform
+
+
+class Architecture(Enum):
+    X86_64 = "amd64"
+    ARM64 = "arm64"
+
+    @property
+    def platform(self) -> Platform:
+        return Platform.LINUX_ARM64 if self is Architecture.ARM64 else Platform.LINUX_AMD64
+
+    @property
+    def cpu_architecture(self) -> ecs.CpuArchitecture:
+        return ecs.CpuArchitecture.ARM64 if self is Architecture.ARM64 else ecs.CpuArchitecture.X86_64
+
+    @property
+    def ami_hardware_type(self) -> ecs.AmiHardwareType:
+        return ecs.AmiHardwareType.ARM if self is Architecture.ARM64 else ecs.AmiHardwareType.STANDARD
+
+    @classmethod
+    def of_instance_type(cls, instance_type: str) -> "Architecture":
+        if ec2.InstanceType(instance_type).architecture == ec2.InstanceArchitecture.ARM_64:
+            return cls.ARM64
+        return cls.X86_64
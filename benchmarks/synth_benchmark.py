@@ -0,0 +1,311 @@
+"""Synthesis benchmarks for the construct library.
+
+Every case synthesizes one stack with N instances of a construct, offline and against
+stubbed assets, in its own process, and records:
+
+  wall_time_s     construct instantiation plus app.synth()
+  peak_rss_mib    peak resident memory of the largest process (python or the jsii runtime)
+  resources       CloudFormation resources across all synthesized templates
+  template_bytes  size of all synthesized templates, normalized (see below)
+
+Usage:
+
+  python benchmarks/synth_benchmark.py                        # run and compare with baseline.json
+  python benchmarks/synth_benchmark.py --update-baseline      # record a new baseline
+  python benchmarks/synth_benchmark.py --cases ec2_service --counts 1 10
+  python benchmarks/synth_benchmark.py --compare-ref $(git merge-base HEAD main)   # also gate time and memory
+  python benchmarks/synth_benchmark.py --compare-ref HEAD~1 --threshold wall_time_s=0.5
+
+baseline.json only holds the deterministic metrics, resources and template_bytes, which are
+the same on every host: the CDKMetadata resource (which encodes the runtime versions) and the
+asset and path metadata are not synthesized, and template_bytes is the size of the compact
+JSON with every asset hash replaced by a placeholder, so neither the files on the host nor
+the CDK output formatting change it. Time and memory depend on the host and its load, so they are only
+gated with --compare-ref: the library at that git ref (e.g. the merge-base) is checked out
+into a temporary worktree and benchmarked in the same run, case by case alternating with
+the working tree.
+
+Exits with 1 when any gated metric of any case grows by more than its threshold (a fraction
+of the reference value).
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS_PATH = Path(__file__).resolve().parent
+LIBRARY_PATH = BENCHMARKS_PATH.parent
+BASELINE_PATH = BENCHMARKS_PATH / "baseline.json"
+# imported under a fixed name, the checkout directory does not have to be a valid identifier
+LIBRARY_NAME = "cdk_custom_constructs"
+
+COUNTS = (1, 10, 50, 200)
+METRICS = ("wall_time_s", "peak_rss_mib", "resources", "template_bytes")
+# compared with baseline.json
+TEMPLATE_METRICS = ("resources", "template_bytes")
+# compared with a run of --compare-ref on the same host
+HOST_METRICS = ("wall_time_s", "peak_rss_mib")
+# allowed growth over the reference; timings are noisy, the template is deterministic
+DEFAULT_THRESHOLDS = {
+    "wall_time_s": 0.25,
+    "peak_rss_mib": 0.20,
+    "resources": 0.0,
+    "template_bytes": 0.05,
+}
+
+STACK_RESOURCE_LIMIT_CONTEXT = "@aws-cdk/core:stackResourceLimit"
+# host dependent parts of the templates, left out so the template metrics are reproducible
+APP_CONTEXT = {
+    "aws:cdk:version-reporting": False,
+    "aws:cdk:enable-asset-metadata": False,
+    "aws:cdk:enable-path-metadata": False,
+}
+ASSET_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+# stub key material, never used to connect
+PUBLIC_KEY = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIBenchmarkStubKeyBenchmarkStubKeyBench benchmark"
+
+
+def load_library(library_path: Path) -> None:
+    spec = importlib.util.spec_from_file_location(LIBRARY_NAME, library_path / "__init__.py",
+                                                  submodule_search_locations=[str(library_path)])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[LIBRARY_NAME] = module
+    spec.loader.exec_module(module)
+    # loading the jsii modules takes seconds and is the same for every case, so it is kept
+    # out of the measurement
+    for name in ("ec2_service", "fargate_service", "ecr_repository", "ecs_cluster", "ec2_instance", "fleet"):
+        # older refs of --compare-ref may not have every module yet
+        if (library_path / f"{name}.py").exists():
+            importlib.import_module(f"{LIBRARY_NAME}.{name}")
+
+
+def stub_assets(directory: Path) -> dict:
+    # a docker context and a user data script; synth only stages and hashes them
+    (directory / "image").mkdir()
+    (directory / "image" / "Dockerfile").write_text("FROM scratch\n")
+    (directory / "user_data.sh").write_text("echo benchmark\n")
+    return {"code_path": directory / "image", "user_data_path": str(directory / "user_data.sh")}
+
+
+def build_case(case: str, count: int, stack, assets: dict) -> None:
+    from aws_cdk import aws_ec2 as ec2
+    from aws_cdk import aws_ecr as ecr
+    from aws_cdk import aws_ecs as ecs
+
+    ec2_service = sys.modules[f"{LIBRARY_NAME}.ec2_service"]
+    fargate_service = sys.modules[f"{LIBRARY_NAME}.fargate_service"]
+    ecr_repository = sys.modules[f"{LIBRARY_NAME}.ecr_repository"]
+    ecs_cluster = sys.modules[f"{LIBRARY_NAME}.ecs_cluster"]
+    ec2_instance = sys.modules[f"{LIBRARY_NAME}.ec2_instance"]
+    fleet = sys.modules.get(f"{LIBRARY_NAME}.fleet")
+
+    vpc = ec2.Vpc(stack, "Vpc", max_azs=2)
+    subnets = ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS)
+
+    if case == "ec2_service":
+        cluster = ec2_service.EC2Cluster(stack, "Cluster", vpc=vpc, subnets=subnets, public_key=PUBLIC_KEY,
+                                         instance_type="m5.large", env_dict={}, max_capacity=count,
+                                         desired_capacity=1)
+        for i in range(count):
+            ec2_service.EC2Service(stack, f"Service{i}", vpc=vpc, subnets=subnets, ec2_cluster=cluster,
+                                   container_image=ecs.ContainerImage.from_registry("nginx"),
+                                   container_name="web", ports=[80])
+    elif case == "ec2_service_fleet":
+        cluster = ec2_service.EC2Cluster(stack, "Cluster", vpc=vpc, subnets=subnets, public_key=PUBLIC_KEY,
+                                         instance_type="m5.large", env_dict={}, max_capacity=count,
+                                         desired_capacity=1)
+        services = fleet.Fleet(stack, "Fleet", vpc=vpc)
+        for i in range(count):
+            services.add_service(ec2_service.EC2Service, f"Service{i}", vpc=vpc, subnets=subnets,
+                                 ec2_cluster=cluster, container_image=ecs.ContainerImage.from_registry("nginx"),
+                                 container_name="web", ports=[80])
+    elif case == "ecs_service":
+        cluster = ecs.Cluster(stack, "Cluster", vpc=vpc)
+        repository = ecr.Repository(stack, "Repository")
+        for i in range(count):
+            fargate_service.ECSService(stack, f"Service{i}", vpc=vpc, subnets=subnets, cluster=cluster,
+                                       repository=repository, image_tag="v1", port=80)
+    elif case == "ec2_cluster":
+        for i in range(count):
+            ec2_service.EC2Cluster(stack, f"Cluster{i}", vpc=vpc, subnets=subnets, public_key=PUBLIC_KEY,
+                                   instance_type="m5.large", env_dict={}, max_capacity=2, desired_capacity=1)
+    elif case == "ecr_repository":
+        for i in range(count):
+            ecr_repository.ECRRepository(stack, f"Repository{i}", repository_name=f"benchmark-{i}",
+                                         code_path=assets["code_path"], image_tag="v1")
+    elif case == "simple_ec2_service":
+        for i in range(count):
+            ecs_cluster.SimpleEC2Service(stack, f"Service{i}", vpc=vpc, associate_public_ip=True,
+                                         public_key=None, instance_type="t3.small", max_capacity=2,
+                                         desired_capacity=1)
+    elif case == "ec2_instance":
+        key_file = Path(assets["user_data_path"]).with_name("key.pub")
+        key_file.write_text(PUBLIC_KEY + "\n")
+        for i in range(count):
+            ec2_instance.EC2Instance(stack, f"Instance{i}", vpc=vpc, subnets=subnets,
+                                     user_data_path=assets["user_data_path"], public_key=str(key_file),
+                                     env_dict={})
+    else:
+        raise ValueError(f"unknown case {case}")
+
+
+CASES = ("ec2_service", "ec2_service_fleet", "ecs_service", "ec2_cluster", "ecr_repository", "simple_ec2_service", "ec2_instance")
+
+
+def run_worker(case: str, count: int, library_path: Path) -> dict:
+    import aws_cdk as cdk
+
+    load_library(library_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        assets = stub_assets(Path(tmp))
+        start = time.perf_counter()
+        # the constructs print key material and user data while they are built
+        with contextlib.redirect_stdout(io.StringIO()):
+            # large cases go past CloudFormation's 500 resources per stack; the limit is lifted
+            # so their size is still measured
+            app = cdk.App(outdir=str(Path(tmp) / "cdk.out"), context={STACK_RESOURCE_LIMIT_CONTEXT: 0, **APP_CONTEXT})
+            stack = cdk.Stack(app, "Benchmark",
+                              env=cdk.Environment(account="111111111111", region="us-east-1"))
+            build_case(case, count, stack, assets)
+            assembly = app.synth()
+        wall_time = time.perf_counter() - start
+
+        resources = 0
+        template_bytes = 0
+        for path in Path(assembly.directory).glob("*.template.json"):
+            template = json.loads(path.read_text())
+            resources += len(template.get("Resources", {}))
+            compact = json.dumps(template, sort_keys=True, separators=(",", ":"))
+            template_bytes += len(ASSET_HASH_PATTERN.sub("0" * 64, compact).encode("utf-8"))
+
+    return {"wall_time_s": round(wall_time, 3), "resources": resources, "template_bytes": template_bytes}
+
+
+def run_case(case: str, count: int, library_path: Path = LIBRARY_PATH, show_errors: bool = True) -> dict:
+    # a fresh process per case: no jsii state carried over and a clean peak memory reading
+    # deprecation and validation warnings go to stderr and are only shown on failure
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        process = subprocess.Popen([sys.executable, __file__, "--worker", case, str(count), str(library_path)],
+                                   stdout=subprocess.PIPE, stderr=stderr, text=True,
+                                   env={**os.environ, "JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION": "1"})
+        stdout = process.stdout.read()
+        # wait4 instead of wait: the child is reaped together with its resource usage
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            if show_errors:
+                stderr.seek(0)
+                sys.stderr.write(stderr.read())
+            raise RuntimeError(f"{case} x{count} failed with exit code {process.returncode}")
+    result = json.loads(stdout.strip().splitlines()[-1])
+    # ru_maxrss is in KiB on Linux and covers the waited-for jsii runtime as well
+    result["peak_rss_mib"] = round(rusage.ru_maxrss / 1024, 1)
+    return result
+
+
+def compare(results: dict, baseline: dict, thresholds: dict, metrics: tuple) -> list:
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in metrics:
+            base = baseline[key][metric]
+            limit = base * (1 + thresholds[metric])
+            if result[metric] > limit:
+                regressions.append(f"{key} {metric}: {result[metric]} > {base} (+{thresholds[metric]:.0%})")
+    return regressions
+
+
+@contextlib.contextmanager
+def worktree(ref: str):
+    # the library as of ref, next to the working tree; only the library is taken from ref,
+    # the cases are the ones of this script
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "library"
+        subprocess.run(["git", "-C", str(LIBRARY_PATH), "worktree", "add", "--detach", str(path), ref],
+                       check=True, capture_output=True)
+        try:
+            yield path
+        finally:
+            subprocess.run(["git", "-C", str(LIBRARY_PATH), "worktree", "remove", "--force", str(path)],
+                           check=True, capture_output=True)
+
+
+def print_result(key: str, r: dict) -> None:
+    print(f"{key:<32}{r['wall_time_s']:>10}{r['peak_rss_mib']:>10}{r['resources']:>11}{r['template_bytes']:>12}",
+          flush=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark CDK synthesis of the construct library")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--counts", nargs="+", type=int, default=list(COUNTS))
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--compare-ref", metavar="REF", help="gate time and memory against this git ref")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--threshold", action="append", default=[], metavar="METRIC=FRACTION")
+    parser.add_argument("--worker", nargs=3, metavar=("CASE", "COUNT", "LIBRARY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker[0], int(args.worker[1]), Path(args.worker[2]))))
+        return 0
+
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for item in args.threshold:
+        metric, _, fraction = item.partition("=")
+        if metric not in METRICS:
+            parser.error(f"unknown metric {metric}")
+        thresholds[metric] = float(fraction)
+
+    results = {}
+    reference = {}
+    with contextlib.ExitStack() as stack:
+        reference_path = stack.enter_context(worktree(args.compare_ref)) if args.compare_ref else None
+        print(f"{'case':<32}{'wall s':>10}{'peak MiB':>10}{'resources':>11}{'bytes':>12}")
+        for case in args.cases:
+            for count in args.counts:
+                key = f"{case}/{count}"
+                results[key] = run_case(case, count)
+                print_result(key, results[key])
+                if reference_path:
+                    try:
+                        reference[key] = run_case(case, count, reference_path, show_errors=False)
+                    except RuntimeError as e:
+                        # e.g. a case for a construct the reference does not have yet
+                        print(f"{key} skipped at {args.compare_ref}: {e}")
+                        continue
+                    print_result(f"  @{args.compare_ref}", reference[key])
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update({key: {m: r[m] for m in TEMPLATE_METRICS} for key, r in results.items()})
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, reference, thresholds, HOST_METRICS)
+    if args.baseline.exists():
+        regressions += compare(results, json.loads(args.baseline.read_text()), thresholds, TEMPLATE_METRICS)
+    else:
+        print(f"no baseline at {args.baseline}, run with --update-baseline first")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+from typing import Optional
+
+from aws_cdk import aws_ec2 as ec2
+
+ROOT_DEVICE_NAME = "/dev/xvda"
+# root volume size of the ECS-optimized Amazon Linux 2 AMI
+DEFAULT_ROOT_VOLUME_GIB = 30
+# gp3 baseline, included in the volume price
+GP3_BASELINE_IOPS = 3000
+GP3_MAX_IOPS_PER_GIB = 500
+GP3_MAX_THROUGHPUT_PER_IOPS = 0.25
+
+# Runs on every boot, before docker starts: instance store volumes come back empty after a
+# stop, so they are (re)assembled into a RAID 0 array when there are several, formatted and
+# mounted as docker's data root. Instance types without instance store are left untouched.
+INSTANCE_STORE_DOCKER_ROOT = """#cloud-boothook
+#!/bin/bash
+set -eu
+mountpoint -q /var/lib/docker && exit 0
+devices=$(for d in /dev/disk/by-id/nvme-Amazon_EC2_NVMe_Instance_Storage_*; do
+    [ -e "$d" ] && readlink -f "$d"
+done | grep -Ev 'p[0-9]+$' | sort -u)
+[ -z "$devices" ] && exit 0
+count=$(echo "$devices" | wc -l)
+if [ "$count" -gt 1 ]; then
+    mdadm --create /dev/md0 --force --run --level=0 --raid-devices="$count" $devices
+    target=/dev/md0
+else
+    target=$devices
+fi
+mkfs.xfs -f "$target"
+mkdir -p /var/lib/docker
+mount -o defaults,noatime "$target" /var/lib/docker
+"""
+
+
+def gp3_root_volume(size_gib: int,
+                    iops: Optional[int] = None,
+                    throughput_mibps: Optional[int] = None,
+                    encrypted: Optional[bool] = None) -> ec2.BlockDevice:
+    # gp3 decouples performance from size; the only ties are the IOPS per GiB and
+    # throughput per IOPS ratios
+    if iops is not None and iops > size_gib * GP3_MAX_IOPS_PER_GIB:
+        raise ValueError(f"gp3 supports at most {GP3_MAX_IOPS_PER_GIB} IOPS per GiB")
+    if throughput_mibps is not None and \
+            throughput_mibps > (iops or GP3_BASELINE_IOPS) * GP3_MAX_THROUGHPUT_PER_IOPS:
+        raise ValueError(f"gp3 supports at most {GP3_MAX_THROUGHPUT_PER_IOPS} MiB/s per provisioned IOPS")
+    return ec2.BlockDevice(device_name=ROOT_DEVICE_NAME,
+                           volume=ec2.BlockDeviceVolume.ebs(size_gib,
+                                                            encrypted=encrypted,
+                                                            iops=iops,
+                                                            throughput=throughput_mibps,
+                                                            volume_type=ec2.EbsDeviceVolumeType.GP3))
+
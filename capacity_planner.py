@@ -0,0 +1,186 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import aws_cdk as cdk
+import jsii
+from constructs import Construct, IConstruct
+
+from .instance_specs import InstanceSpec, instance_spec
+
+
+@dataclass
+class PlannedService:
+    name: str
+    # reserved per task: CPU units and memory (reservation, or the hard limit without one)
+    cpu: int
+    memory_mib: int
+    desired_count: int
+    max_count: int
+    # awsvpc tasks each take an ENI of the instance
+    awsvpc: bool = False
+    # static host ports (bridge without dynamic ports, host mode): one task per port and instance
+    host_ports: Tuple[int, ...] = ()
+
+
+@dataclass
+class Placement:
+    instances: int
+    cpu_capacity: int
+    memory_capacity: int
+    instances_used: int = 0
+    cpu_reserved: int = 0
+    memory_reserved: int = 0
+    unplaceable: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def unplaceable_count(self) -> int:
+        return sum(self.unplaceable.values())
+
+    def utilization(self) -> Tuple[float, float]:
+        # of the instances that hold at least one task
+        if not self.instances_used:
+            return 0.0, 0.0
+        return (100 * self.cpu_reserved / (self.cpu_capacity * self.instances_used),
+                100 * self.memory_reserved / (self.memory_capacity * self.instances_used))
+
+
+def pack(services: Sequence[PlannedService],
+         spec: InstanceSpec,
+         instances: int,
+         use_max_count: bool = False,
+         check_enis: bool = True,
+         memory_capacity: Optional[int] = None) -> Placement:
+    """First fit decreasing of every task onto identical instances.
+
+    ECS places tasks one at a time with its own strategies, so this is the best case for the
+    given memory per instance (the estimated registered memory unless memory_capacity is set).
+    With the nominal memory of the instance, tasks that do not fit here do not fit in ECS either.
+    """
+    memory_capacity = memory_capacity or spec.registered_memory_mib
+    tasks = [s for s in services for _ in range(s.max_count if use_max_count else s.desired_count)]
+    tasks.sort(key=lambda s: (s.memory_mib, s.cpu), reverse=True)
+
+    placement = Placement(instances=instances,
+                          cpu_capacity=spec.cpu_units,
+                          memory_capacity=memory_capacity)
+    free = [[spec.cpu_units, memory_capacity, spec.awsvpc_task_limit, set()] for _ in range(instances)]
+    for task in tasks:
+        for slot in free:
+            cpu, memory, enis, ports = slot
+            if task.cpu <= cpu and task.memory_mib <= memory \
+                    and (not task.awsvpc or not check_enis or enis > 0) \
+                    and not ports.intersection(task.host_ports):
+                slot[0] -= task.cpu
+                slot[1] -= task.memory_mib
+                slot[2] -= 1 if task.awsvpc else 0
+                ports.update(task.host_ports)
+                placement.cpu_reserved += task.cpu
+                placement.memory_reserved += task.memory_mib
+                break
+        else:
+            placement.unplaceable[task.name] = placement.unplaceable.get(task.name, 0) + 1
+
+    placement.instances_used = sum(1 for cpu, memory, _, _ in free
+                                   if cpu < spec.cpu_units or memory < memory_capacity)
+    return placement
+
+
+@jsii.implements(cdk.IAspect)
+class CapacityPlanner:
+    """Checks at synth time that the services of a cluster fit on its instances.
+
+    Reports as annotations on the cluster: an error when the desired tasks cannot be placed
+    even at max_capacity with the nominal memory of the instances, a warning when they only
+    miss the estimated registered memory or when the max task counts cannot be placed, and
+    the utilization as info. With waste_warning_percent it also warns when more than that share
+    of the CPU or memory of the instances in use stays unreserved.
+    """
+
+    def __init__(self, cluster: Construct,
+                 services: List[PlannedService],
+                 instance_types: Sequence[str],
+                 desired_capacity: int,
+                 max_capacity: int,
+                 managed_scaling: bool = True,
+                 eni_trunking: bool = False,
+                 waste_warning_percent: Optional[int] = None) -> None:
+        self.cluster = cluster
+        self.services = services
+        self.instance_types = instance_types
+        self.desired_capacity = desired_capacity
+        self.max_capacity = max_capacity
+        self.managed_scaling = managed_scaling
+        self.eni_trunking = eni_trunking
+        self.waste_warning_percent = waste_warning_percent
+
+    def visit(self, node: IConstruct) -> None:
+        # runs once, when the cluster itself is visited and every service has been added
+        if node.node.path == self.cluster.node.path and self.services:
+            self.plan()
+
+    def plan(self) -> None:
+        annotations = cdk.Annotations.of(self.cluster)
+        # mixed instance groups are planned with their smallest type
+        known = [(instance_spec(it), it) for it in self.instance_types if instance_spec(it)]
+        if not known:
+            annotations.add_info("capacity planner: no offline spec for "
+                                 f"{', '.join(self.instance_types) or 'attribute based instance types'}, skipped")
+            return
+        spec, instance_type = min(known, key=lambda k: (k[0].registered_memory_mib, k[0].cpu_units))
+
+        # with ENI trunking the awsvpc limit depends on the trunk interface, which the table
+        # does not cover
+        check_enis = not self.eni_trunking
+
+        # the registered memory is an estimate; only what exceeds the nominal memory is an error
+        for service in self.services:
+            message = (f"capacity planner: a {service.name} task ({service.cpu} CPU units, {service.memory_mib} MiB) "
+                       f"does not fit on {instance_type} ({spec.cpu_units} CPU units, {spec.memory_mib} MiB, "
+                       f"about {spec.registered_memory_mib} MiB registered)")
+            if service.cpu > spec.cpu_units or service.memory_mib > spec.memory_mib:
+                annotations.add_error(message)
+            elif service.memory_mib > spec.registered_memory_mib:
+                annotations.add_warning(f"{message}; it may fit depending on the memory ECS registers")
+
+        desired = pack(self.services, spec, self.max_capacity, check_enis=check_enis)
+        if desired.unplaceable:
+            message = (f"capacity planner: {desired.unplaceable_count} desired tasks cannot be placed on "
+                       f"{self.max_capacity} x {instance_type}: {self._describe(desired.unplaceable)}")
+            nominal = pack(self.services, spec, self.max_capacity, check_enis=check_enis,
+                           memory_capacity=spec.memory_mib)
+            if nominal.unplaceable:
+                annotations.add_error(message)
+            else:
+                annotations.add_warning(f"{message}; they may fit depending on the memory ECS registers")
+        elif desired.instances_used > self.desired_capacity:
+            message = (f"capacity planner: the desired tasks need {desired.instances_used} x {instance_type}, "
+                       f"desired_capacity is {self.desired_capacity}")
+            if self.managed_scaling:
+                annotations.add_info(f"{message}; managed scaling launches the rest")
+            else:
+                annotations.add_warning(f"{message}; tasks stay PENDING until the group grows")
+
+        maximum = pack(self.services, spec, self.max_capacity, use_max_count=True, check_enis=check_enis)
+        if maximum.unplaceable:
+            annotations.add_warning(
+                f"capacity planner: {maximum.unplaceable_count} tasks at max count cannot be placed on "
+                f"{self.max_capacity} x {instance_type}: {self._describe(maximum.unplaceable)}")
+
+        for label, placement in (("desired", desired), ("max", maximum)):
+            cpu, memory = placement.utilization()
+            annotations.add_info(
+                f"capacity planner: {label} tasks use {placement.instances_used} of {placement.instances} "
+                f"x {instance_type}, {cpu:.0f}% CPU and {memory:.0f}% memory reserved")
+
+        cpu, memory = desired.utilization()
+        idle_cpu, idle_memory = 100 - cpu, 100 - memory
+        if self.waste_warning_percent is not None and desired.instances_used \
+                and max(idle_cpu, idle_memory) > self.waste_warning_percent:
+            annotations.add_warning(
+                f"capacity planner: {idle_cpu:.0f}% of the CPU and {idle_memory:.0f}% of the memory of the "
+                f"{desired.instances_used} instances needed for the desired tasks stay unreserved; "
+                f"consider an instance type closer to the task shape")
+
+    @staticmethod
+    def _describe(counts: Dict[str, int]) -> str:
+        return ", ".join(f"{name} ({count})" for name, count in sorted(counts.items()))
@@ -9,6 +9,11 @@ from constructs import Construct
 from pathlib import Path
 import os
 
+from typing import Optional, Sequence
+
+from .block_devices import DEFAULT_ROOT_VOLUME_GIB, INSTANCE_STORE_DOCKER_ROOT, ROOT_DEVICE_NAME, gp3_root_volume
+from .user_data import UserDataBuilder, UserDataSizeCheck
+
 class EC2Instance(Construct):
     def __init__(self, scope: Construct, id: str,
                  vpc: ec2.IVpc,
@@ -16,6 +21,13 @@ class EC2Instance(Construct):
                  user_data_path: str,
                  public_key: str,
                  env_dict: dict,
+                 instance_type: str = "t2.micro",
+                 root_volume_size_gib: Optional[int] = None,
+                 root_volume_iops: Optional[int] = None,
+                 root_volume_throughput_mibps: Optional[int] = None,
+                 block_devices: Optional[Sequence[ec2.BlockDevice]] = None,
+                 instance_store_docker_root: bool = False,
+                 compress_user_data: Optional[bool] = None,
                  **kwargs) -> None:
         super().__init__(scope, id)
 
@@ -41,21 +53,22 @@ class EC2Instance(Construct):
                                  key_name=f"{id}EC2InstanceSSHKey",
                                  public_key_material=pub_key)
 
-        user_data = ec2.UserData.for_linux()
+        user_data = UserDataBuilder(compress=compress_user_data)
+        user_data.add_env(env_dict)
+        user_data.add_file(user_data_path)
 
-        print("adding environment user data")
-        for k,v in env_dict.items():
-            commands = list() 
-            commands.append(f"{k}={v}")
-            commands.append(f"echo 'export {k}={v}' >> /etc/profile")
-            for cmd in commands:
-                print(cmd)
-                user_data.add_commands(cmd)
+        if any(bd.device_name == ROOT_DEVICE_NAME for bd in block_devices or []):
+            raise ValueError(f"configure {ROOT_DEVICE_NAME} through the root_volume_* arguments")
+        instance_block_devices = list(block_devices or [])
+        if any(v is not None for v in (root_volume_size_gib, root_volume_iops, root_volume_throughput_mibps)):
+            instance_block_devices.insert(0, gp3_root_volume(root_volume_size_gib or DEFAULT_ROOT_VOLUME_GIB,
+                                                             iops=root_volume_iops,
+                                                             throughput_mibps=root_volume_throughput_mibps))
 
-        with open(str(user_data_path)) as fp:
-            lines = fp.readlines()
-            for line in lines:
-                user_data.add_commands(line)
+        if instance_store_docker_root:
+            user_data.add_boothook(INSTANCE_STORE_DOCKER_ROOT)
+        self.user_data_hash = user_data.hash
+        self.user_data = user_data.build()
 
         instance = ec2.Instance(self, "EC2",
                               vpc=vpc,
@@ -64,9 +77,11 @@ class EC2Instance(Construct):
                               security_group=security_group,
                               key_name=ssh_key.key_name,
                               machine_image=ecs.EcsOptimizedImage.amazon_linux(),
-                              instance_type=ec2.InstanceType("t2.micro"),
-                              user_data=user_data,
+                              instance_type=ec2.InstanceType(instance_type),
+                              block_devices=instance_block_devices or None,
+                              user_data=self.user_data,
                               user_data_causes_replacement=True)
+        instance.node.add_validation(UserDataSizeCheck(self.user_data))
 
         CfnOutput(self, "EC2InstanceSSHKeyID", value=ssh_key.attr_key_pair_id)
         CfnOutput(self, "EC2InstanceInstanceID", value=instance.instance_id)
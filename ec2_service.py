@@ -9,6 +9,11 @@ from aws_cdk import (
     aws_ec2 as ec2,
     aws_ecr as ecr,
     aws_autoscaling as autoscaling,
+    aws_events as events,
+    aws_events_targets as events_targets,
+    aws_lambda as lambda_,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_sqs as sqs,
     custom_resources as cr
 )
 
@@ -16,9 +21,70 @@ import re
 import os
 from pathlib import Path
 
-from typing import Optional, Sequence, Mapping, Union, Dict, List
+from typing import Optional, Sequence, Mapping, Union, Dict, List, Tuple
 import logging
 
+from .architecture import Architecture
+from .block_devices import DEFAULT_ROOT_VOLUME_GIB, INSTANCE_STORE_DOCKER_ROOT, ROOT_DEVICE_NAME, gp3_root_volume
+from .capacity_planner import CapacityPlanner, PlannedService
+from .fleet import Fleet
+from .instance_specs import instance_spec
+from .load_balancing import LoadBalancerOptions, attach_load_balancer
+from .log_options import FIRELENS_ROUTER_MEMORY_MIB, LogOptions, build_log_driver
+from .service_discovery import ServiceDiscoveryOptions, configure_service_discovery
+from .storage import BindMount, add_bind_mounts
+from .user_data import UserDataBuilder, UserDataSizeCheck
+from .vpc_endpoints import ServiceEndpoints
+
+# docker's ephemeral range used for dynamic host port mappings on the ECS-optimized AMI
+EPHEMERAL_PORT_RANGE = (32768, 65535)
+
+PREDICTIVE_SCALING_MODES = ("ForecastOnly", "ForecastAndScale")
+MAX_PREDICTIVE_SCALING_BUFFER_SECONDS = 3600
+
+HANDLERS_PATH = Path(__file__).parent / "handlers"
+DEFAULT_DRAINING_TIMEOUT_SECONDS = 900
+DRAINING_POLL_SECONDS = 30
+# the hook outlives the drain timeout by this much, so the handler can still complete the
+# action; lifecycle hooks time out after at most two hours
+DRAINING_COMPLETION_MARGIN_SECONDS = 120
+MAX_LIFECYCLE_HOOK_TIMEOUT_SECONDS = 7200
+
+
+def _hibernation_root_volume_gib(instance_type: str) -> Optional[int]:
+    # the RAM is written to the root volume next to the OS and the images, so the volume is the
+    # RAM, rounded up to GiB, plus the usual root volume; None for unknown types
+    spec = instance_spec(instance_type)
+    if spec is None:
+        return None
+    return -(-spec.memory_mib // 1024) + DEFAULT_ROOT_VOLUME_GIB
+
+
+def _drain_instance_handler(scope: Construct) -> Tuple[sqs.Queue, lambda_.Function]:
+    # one queue and drain function per stack, shared by every cluster in it. Each check is a
+    # short invocation; while tasks are still running the message goes back to the queue with
+    # a delay instead of keeping the function waiting.
+    stack = cdk.Stack.of(scope)
+    queue = stack.node.try_find_child("ECSDrainInstanceQueue")
+    if queue is None:
+        queue = sqs.Queue(stack, "ECSDrainInstanceQueue",
+                          visibility_timeout=cdk.Duration.minutes(2),
+                          dead_letter_queue=sqs.DeadLetterQueue(
+                              max_receive_count=5,
+                              queue=sqs.Queue(stack, "ECSDrainInstanceDeadLetterQueue")))
+        function = lambda_.Function(stack, "ECSDrainInstanceFunction",
+                                    runtime=lambda_.Runtime.PYTHON_3_12,
+                                    handler="index.on_event",
+                                    code=lambda_.Code.from_asset(str(HANDLERS_PATH / "drain_instance")),
+                                    timeout=cdk.Duration.minutes(1),
+                                    environment={
+                                        "QUEUE_URL": queue.queue_url,
+                                        "POLL_SECONDS": str(DRAINING_POLL_SECONDS)
+                                    })
+        function.add_event_source(lambda_event_sources.SqsEventSource(queue, report_batch_item_failures=True))
+        queue.grant_send_messages(function)
+    return queue, stack.node.find_child("ECSDrainInstanceFunction")
+
 
 class EC2Cluster(Construct):
     def __init__(self, scope: Construct, id: str,
@@ -31,6 +97,41 @@ class EC2Cluster(Construct):
                  desired_capacity: int,
                  user_data_path: Optional[str] = "",
                  profile_policies: Optional[List[iam.PolicyStatement]] = [],
+                 enable_eni_trunking: bool = False,
+                 min_capacity: Optional[int] = None,
+                 enable_managed_scaling: bool = True,
+                 target_capacity_percent: Optional[int] = None,
+                 minimum_scaling_step_size: Optional[int] = None,
+                 maximum_scaling_step_size: Optional[int] = None,
+                 instance_warmup_period: Optional[int] = None,
+                 enable_managed_termination_protection: Optional[bool] = None,
+                 enable_warm_pool: bool = False,
+                 warm_pool_min_size: Optional[int] = None,
+                 warm_pool_max_prepared_capacity: Optional[int] = None,
+                 warm_pool_state: autoscaling.PoolState = autoscaling.PoolState.STOPPED,
+                 warm_pool_reuse_on_scale_in: bool = False,
+                 instance_types: Optional[Sequence[str]] = None,
+                 vcpu_count_range: Optional[Tuple[int, Optional[int]]] = None,
+                 memory_mib_range: Optional[Tuple[int, Optional[int]]] = None,
+                 on_demand_base_capacity: Optional[int] = None,
+                 on_demand_percentage_above_base_capacity: Optional[int] = None,
+                 spot_allocation_strategy: autoscaling.SpotAllocationStrategy = autoscaling.SpotAllocationStrategy.CAPACITY_OPTIMIZED,
+                 capacity_rebalance: bool = False,
+                 vpc_endpoints: Optional[ServiceEndpoints] = None,
+                 root_volume_size_gib: Optional[int] = None,
+                 root_volume_iops: Optional[int] = None,
+                 root_volume_throughput_mibps: Optional[int] = None,
+                 block_devices: Optional[Sequence[ec2.BlockDevice]] = None,
+                 instance_store_docker_root: bool = False,
+                 scheduled_actions: Optional[Mapping[str, autoscaling.BasicScheduledActionProps]] = None,
+                 predictive_scaling_mode: Optional[str] = None,
+                 predictive_scaling_target_cpu_percent: int = 50,
+                 predictive_scaling_buffer_seconds: Optional[int] = None,
+                 enable_capacity_planner: bool = True,
+                 capacity_waste_warning_percent: Optional[int] = None,
+                 compress_user_data: Optional[bool] = None,
+                 enable_draining_hook: bool = False,
+                 draining_timeout_seconds: int = DEFAULT_DRAINING_TIMEOUT_SECONDS,
                  suffix: Optional[str] = "",
                  **kwargs) -> None:
         super().__init__(scope, id)
@@ -51,21 +152,39 @@ class EC2Cluster(Construct):
 
         # Customized capacity for cluster
 
+        # mixed instances: either an explicit list of instance types or attribute based
+        # selection, with on-demand base capacity and Spot above it
+        use_instance_requirements = bool(vcpu_count_range or memory_mib_range)
+        if instance_types and use_instance_requirements:
+            raise ValueError("instance_types and vcpu/memory ranges are mutually exclusive")
+        if use_instance_requirements and not (vcpu_count_range and memory_mib_range):
+            raise ValueError("attribute based instance selection needs both vcpu_count_range and memory_mib_range")
+        use_mixed_instances = bool(instance_types) or use_instance_requirements
+        # the ECS-optimized AMI has to match the CPU architecture of every instance type
+        architecture = Architecture.of_instance_type(instance_type)
+        if any(Architecture.of_instance_type(it) != architecture for it in instance_types or []):
+            raise ValueError("instance_types must all share the CPU architecture of instance_type")
+        uses_spot = use_mixed_instances and on_demand_percentage_above_base_capacity is not None \
+            and on_demand_percentage_above_base_capacity < 100
+        if use_mixed_instances and enable_warm_pool:
+            raise ValueError("warm pools are not supported for auto scaling groups with a mixed instances policy")
+
         # user data for launch template
-        user_data = ec2.UserData.for_linux()
+        user_data = UserDataBuilder(compress=compress_user_data)
+
+        if uses_spot:
+            user_data.add_commands("echo 'ECS_ENABLE_SPOT_INSTANCE_DRAINING=true' >> /etc/ecs/ecs.config")
 
-        for k, v in env_dict.items():
-            commands = list()
-            commands.append(f"{k}={v}")
-            commands.append(f"echo 'export {k}={v}' >> /etc/profile")
-            for cmd in commands:
-                user_data.add_commands(cmd)
+        # user data only runs on the first boot, while the instance is being prepared for the
+        # warm pool. The check keeps the ECS agent from registering the instance with the
+        # cluster until it has left the pool and is InService.
+        if enable_warm_pool:
+            user_data.add_commands("echo 'ECS_WARM_POOLS_CHECK=true' >> /etc/ecs/ecs.config")
+
+        user_data.add_env(env_dict)
 
         if user_data_path:
-            with open(str(user_data_path)) as fp:
-                lines = fp.readlines()
-                for line in lines:
-                    user_data.add_commands(line)
+            user_data.add_file(user_data_path)
 
         self.security_group = ec2.SecurityGroup(self, "SG",
                                                 vpc=vpc,
@@ -90,25 +209,98 @@ class EC2Cluster(Construct):
             ssh_key = read_pub_key(public_key)
             key_name = ssh_key.key_name
 
+        # image layers and container scratch space live on the root volume unless they are
+        # moved to instance store; gp3 performance can be raised independently of its size.
+        # Hibernation needs an encrypted root volume large enough to hold the instance's RAM.
+        hibernate = enable_warm_pool and warm_pool_state == autoscaling.PoolState.HIBERNATED
+        if any(bd.device_name == ROOT_DEVICE_NAME for bd in block_devices or []):
+            raise ValueError(f"configure {ROOT_DEVICE_NAME} through the root_volume_* arguments")
+        launch_block_devices = list(block_devices or [])
+        default_size = DEFAULT_ROOT_VOLUME_GIB
+        if hibernate:
+            # warm pools rule out mixed instances, so the group only runs instance_type
+            hibernation_size = _hibernation_root_volume_gib(instance_type)
+            if hibernation_size is None and root_volume_size_gib is None:
+                raise ValueError("root_volume_size_gib is required to hibernate instances of unknown memory size")
+            if hibernation_size is not None and root_volume_size_gib is not None \
+                    and root_volume_size_gib < hibernation_size:
+                raise ValueError(f"root_volume_size_gib must hold the instance's RAM next to the OS and the "
+                                 f"images, at least {hibernation_size} GiB")
+            default_size = hibernation_size
+        if hibernate or any(v is not None for v in (root_volume_size_gib, root_volume_iops, root_volume_throughput_mibps)):
+            launch_block_devices.insert(0, gp3_root_volume(root_volume_size_gib or default_size,
+                                                           iops=root_volume_iops,
+                                                           throughput_mibps=root_volume_throughput_mibps,
+                                                           encrypted=True if hibernate else None))
+
+        if instance_store_docker_root:
+            user_data.add_boothook(INSTANCE_STORE_DOCKER_ROOT)
+
+        # rendering is deterministic (gzip included), so an unchanged script leaves the launch
+        # template and its instances alone; the hash ties each template version to its script
+        self.user_data_hash = user_data.hash
+        self.user_data = user_data.build()
         launch_template = ec2.LaunchTemplate(self, "LaunchTemplate",
-                                             machine_image=ecs.EcsOptimizedImage.amazon_linux2(),
-                                             user_data=user_data,
+                                             machine_image=ecs.EcsOptimizedImage.amazon_linux2(architecture.ami_hardware_type),
+                                             hibernation_configured=hibernate or None,
+                                             block_devices=launch_block_devices or None,
+                                             user_data=self.user_data,
+                                             version_description=f"user data {self.user_data_hash[:16]}",
                                              role=self.iam_role,
                                              # instance_profile=instance_profile,
-                                             instance_type=ec2.InstanceType(instance_type),
+                                             instance_type=None if use_instance_requirements else ec2.InstanceType(instance_type),
                                              key_name=key_name,
                                              security_group=self.security_group,
                                              )
+        # checked at synth, after the capacity provider has added the cluster config
+        launch_template.node.add_validation(UserDataSizeCheck(self.user_data))
+
+        mixed_instances_policy = None
+        if use_mixed_instances:
+            if use_instance_requirements:
+                launch_template_overrides = [autoscaling.LaunchTemplateOverrides(
+                    instance_requirements=autoscaling.CfnAutoScalingGroup.InstanceRequirementsProperty(
+                        v_cpu_count=autoscaling.CfnAutoScalingGroup.VCpuCountRequestProperty(
+                            min=vcpu_count_range[0], max=vcpu_count_range[1]),
+                        memory_mib=autoscaling.CfnAutoScalingGroup.MemoryMiBRequestProperty(
+                            min=memory_mib_range[0], max=memory_mib_range[1])
+                    )
+                )]
+            else:
+                launch_template_overrides = [
+                    autoscaling.LaunchTemplateOverrides(instance_type=ec2.InstanceType(it))
+                    for it in instance_types
+                ]
+            mixed_instances_policy = autoscaling.MixedInstancesPolicy(
+                launch_template=launch_template,
+                launch_template_overrides=launch_template_overrides,
+                instances_distribution=autoscaling.InstancesDistribution(
+                    on_demand_base_capacity=on_demand_base_capacity,
+                    on_demand_percentage_above_base_capacity=on_demand_percentage_above_base_capacity,
+                    spot_allocation_strategy=spot_allocation_strategy
+                )
+            )
 
         # Create an Auto Scaling Group
         self.auto_scaling_group = autoscaling.AutoScalingGroup(self, "AutoScalingGroup",
                                                                vpc=vpc,
+                                                               min_capacity=min_capacity,
                                                                max_capacity=max_capacity,
                                                                desired_capacity=desired_capacity,
-                                                               launch_template=launch_template,
+                                                               launch_template=None if mixed_instances_policy else launch_template,
+                                                               mixed_instances_policy=mixed_instances_policy,
+                                                               capacity_rebalance=capacity_rebalance or None,
                                                                vpc_subnets=subnets
                                                                )
 
+        if enable_warm_pool:
+            self.warm_pool = self.auto_scaling_group.add_warm_pool(
+                min_size=warm_pool_min_size,
+                max_group_prepared_capacity=warm_pool_max_prepared_capacity,
+                pool_state=warm_pool_state,
+                reuse_on_scale_in=warm_pool_reuse_on_scale_in
+            )
+
         # for ASG deletions: https://github.com/aws/aws-cdk/issues/18179
         asg_force_delete = cr.AwsCustomResource(self, "AsgForceDelete",
                                                 on_delete=cr.AwsSdkCall(
@@ -125,12 +317,151 @@ class EC2Cluster(Construct):
                                                 )
         asg_force_delete.node.add_dependency(self.auto_scaling_group)
 
+        # ENI trunking raises the awsvpc task limit per instance; the setting is read when the
+        # container instance registers, so it must be in place before the ASG launches anything
+        if enable_eni_trunking:
+            eni_trunking = cr.AwsCustomResource(self, "EniTrunking",
+                                                on_create=cr.AwsSdkCall(
+                                                    service='ECS',
+                                                    action='putAccountSetting',
+                                                    parameters={
+                                                        "name": "awsvpcTrunking",
+                                                        "value": "enabled",
+                                                        "principalArn": self.iam_role.role_arn
+                                                    },
+                                                    physical_resource_id=cr.PhysicalResourceId.of(
+                                                        f"{id}{suffix}EniTrunking")
+                                                ),
+                                                policy=cr.AwsCustomResourcePolicy.from_sdk_calls(
+                                                    resources=cr.AwsCustomResourcePolicy.ANY_RESOURCE
+                                                )
+                                                )
+            self.auto_scaling_group.node.add_dependency(eni_trunking)
+
         # Add custom cluster capacity
+        # a target capacity below 100% keeps spare instances running so new tasks are placed
+        # immediately instead of waiting in PROVISIONING for an instance to boot
+        if target_capacity_percent is not None and not 0 < target_capacity_percent <= 100:
+            raise ValueError("target_capacity_percent must be between 1 and 100")
+        # managed termination protection relies on managed scaling; CDK enables it when unset
+        if not enable_managed_scaling:
+            if enable_managed_termination_protection:
+                raise ValueError("enable_managed_termination_protection requires enable_managed_scaling")
+            enable_managed_termination_protection = False
         self.capacity_provider = ecs.AsgCapacityProvider(self, "AsgCapacityProvider",
-                                                         auto_scaling_group=self.auto_scaling_group
+                                                         auto_scaling_group=self.auto_scaling_group,
+                                                         enable_managed_scaling=enable_managed_scaling,
+                                                         target_capacity_percent=target_capacity_percent,
+                                                         minimum_scaling_step_size=minimum_scaling_step_size,
+                                                         maximum_scaling_step_size=maximum_scaling_step_size,
+                                                         instance_warmup_period=instance_warmup_period,
+                                                         enable_managed_termination_protection=enable_managed_termination_protection,
+                                                         # the draining hook replaces ECS managed draining
+                                                         enable_managed_draining=False if enable_draining_hook else None
                                                          )
         self.cluster.add_asg_capacity_provider(self.capacity_provider)
 
+        # scale-in and instance refresh terminate instances regardless of their tasks; the hook
+        # holds the termination while the instance is DRAINING, until ECS has moved its tasks
+        # elsewhere or the timeout is up
+        self.draining_hook = None
+        if enable_draining_hook:
+            max_timeout = MAX_LIFECYCLE_HOOK_TIMEOUT_SECONDS - DRAINING_COMPLETION_MARGIN_SECONDS
+            if not 0 < draining_timeout_seconds <= max_timeout:
+                raise ValueError(f"draining_timeout_seconds must be between 1 and {max_timeout}")
+            self.draining_hook = self.auto_scaling_group.add_lifecycle_hook(
+                "DrainingHook",
+                lifecycle_transition=autoscaling.LifecycleTransition.INSTANCE_TERMINATING,
+                default_result=autoscaling.DefaultResult.CONTINUE,
+                heartbeat_timeout=cdk.Duration.seconds(draining_timeout_seconds + DRAINING_COMPLETION_MARGIN_SECONDS))
+
+            queue, drain_function = _drain_instance_handler(self)
+            drain_function.add_to_role_policy(iam.PolicyStatement(
+                actions=["ecs:ListContainerInstances"],
+                resources=[self.cluster.cluster_arn]))
+            drain_function.add_to_role_policy(iam.PolicyStatement(
+                actions=["ecs:DescribeContainerInstances", "ecs:UpdateContainerInstancesState"],
+                resources=[cdk.Stack.of(self).format_arn(service="ecs",
+                                                         resource="container-instance",
+                                                         resource_name=f"{self.cluster.cluster_name}/*")]))
+            drain_function.add_to_role_policy(iam.PolicyStatement(
+                actions=["autoscaling:CompleteLifecycleAction"],
+                resources=[self.auto_scaling_group.auto_scaling_group_arn]))
+
+            events.Rule(self, "DrainingRule",
+                        event_pattern=events.EventPattern(
+                            source=["aws.autoscaling"],
+                            detail_type=["EC2 Instance-terminate Lifecycle Action"],
+                            detail={
+                                "AutoScalingGroupName": [self.auto_scaling_group.auto_scaling_group_name],
+                                "LifecycleHookName": [self.draining_hook.lifecycle_hook_name]
+                            }),
+                        targets=[events_targets.SqsQueue(queue, message=events.RuleTargetInput.from_object({
+                            "Cluster": self.cluster.cluster_name,
+                            "DrainTimeoutSeconds": draining_timeout_seconds,
+                            "Time": events.EventField.time,
+                            "Detail": events.EventField.from_path("$.detail")
+                        }))])
+
+        if vpc_endpoints:
+            vpc_endpoints.add_dependents(self.auto_scaling_group)
+
+        # scheduled actions move the capacity bounds ahead of known peaks, e.g.
+        # {"MorningRamp": BasicScheduledActionProps(schedule=Schedule.cron(hour="7", minute="30"), min_capacity=4)}
+        for action_id, action in (scheduled_actions or {}).items():
+            self.auto_scaling_group.scale_on_schedule(action_id,
+                                                      schedule=action.schedule,
+                                                      min_capacity=action.min_capacity,
+                                                      max_capacity=action.max_capacity,
+                                                      desired_capacity=action.desired_capacity,
+                                                      start_time=action.start_time,
+                                                      end_time=action.end_time,
+                                                      time_zone=action.time_zone)
+
+        # predictive scaling forecasts the daily CPU pattern and raises capacity ahead of it;
+        # ForecastOnly publishes the forecast without acting on it, to check it first. Managed
+        # scaling keeps reacting to the capacity provider reservation on top of the forecast.
+        self.predictive_scaling_policy = None
+        if predictive_scaling_mode:
+            if predictive_scaling_mode not in PREDICTIVE_SCALING_MODES:
+                raise ValueError(f"predictive_scaling_mode must be one of {PREDICTIVE_SCALING_MODES}")
+            if predictive_scaling_buffer_seconds is not None and \
+                    not 0 <= predictive_scaling_buffer_seconds <= MAX_PREDICTIVE_SCALING_BUFFER_SECONDS:
+                raise ValueError(f"predictive_scaling_buffer_seconds must be between 0 and "
+                                 f"{MAX_PREDICTIVE_SCALING_BUFFER_SECONDS}")
+            self.predictive_scaling_policy = autoscaling.CfnScalingPolicy(
+                self, "PredictiveScaling",
+                auto_scaling_group_name=self.auto_scaling_group.auto_scaling_group_name,
+                policy_type="PredictiveScaling",
+                predictive_scaling_configuration=autoscaling.CfnScalingPolicy.PredictiveScalingConfigurationProperty(
+                    mode=predictive_scaling_mode,
+                    # instances are launched this long before the forecast capacity is needed
+                    scheduling_buffer_time=predictive_scaling_buffer_seconds,
+                    max_capacity_breach_behavior="HonorMaxCapacity",
+                    metric_specifications=[
+                        autoscaling.CfnScalingPolicy.PredictiveScalingMetricSpecificationProperty(
+                            target_value=predictive_scaling_target_cpu_percent,
+                            predefined_metric_pair_specification=autoscaling.CfnScalingPolicy.PredictiveScalingPredefinedMetricPairProperty(
+                                predefined_metric_type="ASGCPUUtilization"
+                            )
+                        )
+                    ]
+                )
+            )
+
+        # services register themselves here; the planner bin-packs their tasks onto the
+        # instances during synth and reports what does not fit
+        self.services: List[PlannedService] = []
+        if enable_capacity_planner:
+            cdk.Aspects.of(self).add(CapacityPlanner(self, self.services,
+                                                     instance_types=[] if use_instance_requirements
+                                                     else list(instance_types or [instance_type]),
+                                                     desired_capacity=desired_capacity,
+                                                     max_capacity=max_capacity,
+                                                     managed_scaling=enable_managed_scaling,
+                                                     eni_trunking=enable_eni_trunking,
+                                                     waste_warning_percent=capacity_waste_warning_percent))
+
 
 class EC2Service(Construct):
     def __init__(self, scope: Construct, id: str,
@@ -140,7 +471,7 @@ class EC2Service(Construct):
                  container_image: ecs.ContainerImage,
                  container_name: str,
                  task_family_name: Union[str, None] = None,
-                 task_cpu: int = 1024,
+                 task_cpu: Optional[int] = None,
                  task_memory_mib: int = 256,
                  repository: Optional[ecr.IRepository] = None,
                  ports: Optional[Sequence[int]] = None,
@@ -149,117 +480,266 @@ class EC2Service(Construct):
                  task_role: Optional[iam.IRole] = None,
                  secret_arn: Optional[str] = None,
                  secrets: Optional[Mapping[str, ecs.Secret]] = None,
+                 network_mode: ecs.NetworkMode = ecs.NetworkMode.BRIDGE,
+                 dynamic_host_ports: bool = False,
+                 desired_count: Optional[int] = None,
+                 placement_strategies: Optional[Sequence[ecs.PlacementStrategy]] = None,
+                 placement_constraints: Optional[Sequence[ecs.PlacementConstraint]] = None,
+                 memory_limit_mib: Optional[int] = None,
+                 ulimits: Optional[Sequence[ecs.Ulimit]] = None,
+                 shared_memory_size_mib: Optional[int] = None,
+                 init_process_enabled: Optional[bool] = None,
+                 max_swap_mib: Optional[int] = None,
+                 swappiness: Optional[int] = None,
+                 log_options: Optional[LogOptions] = None,
+                 load_balancer_options: Optional[LoadBalancerOptions] = None,
+                 min_healthy_percent: Optional[int] = None,
+                 max_healthy_percent: Optional[int] = None,
+                 health_check_grace_period_seconds: Optional[int] = None,
+                 enable_circuit_breaker: bool = False,
+                 container_health_check: Optional[ecs.HealthCheck] = None,
+                 service_discovery_options: Optional[ServiceDiscoveryOptions] = None,
+                 vpc_endpoints: Optional[ServiceEndpoints] = None,
+                 bind_mounts: Optional[Mapping[str, BindMount]] = None,
+                 tmpfs_mounts: Optional[Sequence[ecs.Tmpfs]] = None,
+                 max_task_count: Optional[int] = None,
+                 fleet: Optional[Fleet] = None,
                  suffix: Optional[str] = "",
                  **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
-        self.log_group = logs.LogGroup(self, "Logs",
-                                       retention=logs.RetentionDays.ONE_WEEK,
-                                       removal_policy=cdk.RemovalPolicy.DESTROY)
-
-        policy_document = iam.PolicyDocument(
-            statements=[
-                iam.PolicyStatement(
-                    actions=[
-                        "logs:CreateLogStream",
-                        "logs:PutLogEvents"
-                    ],
-                    effect=iam.Effect.ALLOW,
-                    resources=[
-                        self.log_group.log_group_arn,
-                        f"{self.log_group.log_group_arn}:log-stream:ecs/{id}*"
-                    ],
-                    sid="AllowStreamingLogsToCloudWatch"
-                )
-            ]
-        )
-
-        if repository:
-            policy_document.add_statements(
-                iam.PolicyStatement(
-                    actions=["ecr:GetAuthorizationToken"],
-                    effect=iam.Effect.ALLOW,
-                    resources=["*"],
-                    sid="AllowGettingECRAuthorizationToken"
-                ),
-                iam.PolicyStatement(
-                    actions=[
-                        "ecr:BatchCheckLayerAvailability",
-                        "ecr:BatchGetImage",
-                        "ecr:GetDownloadUrlForLayer"
-                    ],
-                    effect=iam.Effect.ALLOW,
-                    resources=[repository.repository_arn],
-                    sid="AllowReadingFromECR"
-                )
+        # a fleet shares one log group and execution role between its services; what each
+        # service pulls and reads is added to the shared role
+        self.fleet = fleet
+        if fleet:
+            self.log_group = fleet.log_group
+            self.task_execution_role = fleet.execution_role
+            if repository:
+                repository.grant_pull(self.task_execution_role)
+            if secret_arn:
+                fleet.grant_secret_read(secret_arn)
+        else:
+            self.log_group = logs.LogGroup(self, "Logs",
+                                           retention=logs.RetentionDays.ONE_WEEK,
+                                           removal_policy=cdk.RemovalPolicy.DESTROY)
+
+            policy_document = iam.PolicyDocument(
+                statements=[
+                    iam.PolicyStatement(
+                        actions=[
+                            "logs:CreateLogStream",
+                            "logs:PutLogEvents"
+                        ],
+                        effect=iam.Effect.ALLOW,
+                        resources=[
+                            self.log_group.log_group_arn,
+                            f"{self.log_group.log_group_arn}:log-stream:ecs/{id}*"
+                        ],
+                        sid="AllowStreamingLogsToCloudWatch"
+                    )
+                ]
             )
 
-        if secret_arn:
-            policy_document.add_statements(
-                iam.PolicyStatement(
-                    actions=[
-                        "secretsmanager:DescribeSecret",
-                        "secretsmanager:GetResourcePolicy",
-                        "secretsmanager:GetSecretValue",
-                        "secretsmanager:ListSecretVersionIds"
-                    ],
-                    effect=iam.Effect.ALLOW,
-                    resources=[
-                        secret_arn
-                    ],
-                    sid="AllowReadingSecret"
+            if repository:
+                policy_document.add_statements(
+                    iam.PolicyStatement(
+                        actions=["ecr:GetAuthorizationToken"],
+                        effect=iam.Effect.ALLOW,
+                        resources=["*"],
+                        sid="AllowGettingECRAuthorizationToken"
+                    ),
+                    iam.PolicyStatement(
+                        actions=[
+                            "ecr:BatchCheckLayerAvailability",
+                            "ecr:BatchGetImage",
+                            "ecr:GetDownloadUrlForLayer"
+                        ],
+                        effect=iam.Effect.ALLOW,
+                        resources=[repository.repository_arn],
+                        sid="AllowReadingFromECR"
+                    )
+                )
+
+            if secret_arn:
+                policy_document.add_statements(
+                    iam.PolicyStatement(
+                        actions=[
+                            "secretsmanager:DescribeSecret",
+                            "secretsmanager:GetResourcePolicy",
+                            "secretsmanager:GetSecretValue",
+                            "secretsmanager:ListSecretVersionIds"
+                        ],
+                        effect=iam.Effect.ALLOW,
+                        resources=[
+                            secret_arn
+                        ],
+                        sid="AllowReadingSecret"
+                    )
                 )
-            )
 
-        self.task_execution_role = iam.Role(self, f"{id}TaskExecutionRole",
-                                            assumed_by=iam.CompositePrincipal(
-                                                iam.ServicePrincipal("ecs.amazonaws.com"),
-                                                iam.ServicePrincipal("ecs-tasks.amazonaws.com")
-                                            ),
-                                            inline_policies={
-                                                f"{id}-task-execution-policy": policy_document
-                                            })
+            self.task_execution_role = iam.Role(self, f"{id}TaskExecutionRole",
+                                                assumed_by=iam.CompositePrincipal(
+                                                    iam.ServicePrincipal("ecs.amazonaws.com"),
+                                                    iam.ServicePrincipal("ecs-tasks.amazonaws.com")
+                                                ),
+                                                inline_policies={
+                                                    f"{id}-task-execution-policy": policy_document
+                                                })
 
         # camel to hyphenated case
         camel_case_id = re.sub(r'(?<!^)(?=[A-Z])', '-', id).lower()
         task_def_id = task_family_name if task_family_name else camel_case_id
         self.task_definition = ecs.Ec2TaskDefinition(self, "TaskDefinition",
                                                      family=task_def_id,
+                                                     network_mode=network_mode,
                                                      task_role=task_role,
                                                      execution_role=self.task_execution_role)
 
+        # awsvpc tasks get their own ENI, so the host port is implied by the container port.
+        # In bridge mode a host port of 0 lets docker pick from the ephemeral range, which
+        # allows several tasks of the same service on one instance.
+        is_awsvpc = network_mode == ecs.NetworkMode.AWS_VPC
+        use_dynamic_ports = dynamic_host_ports and network_mode == ecs.NetworkMode.BRIDGE
+        if dynamic_host_ports and not use_dynamic_ports:
+            raise ValueError("dynamic_host_ports is only supported with the bridge network mode")
+
         port_mappings = list()
-        for i, port in enumerate(ports):
+        for i, port in enumerate(ports or []):
+            if is_awsvpc:
+                host_port = None
+            elif use_dynamic_ports:
+                host_port = 0
+            else:
+                host_port = port
             port_mappings.append(
                 ecs.PortMapping(
                     container_port=port,
-                    host_port=port,
+                    host_port=host_port,
                     name=f"{camel_case_id}_port{i}",
                     protocol=ecs.Protocol.TCP
                 )
             )
 
+        self.security_group = None
+        if is_awsvpc:
+            self.security_group = fleet.security_group if fleet and fleet.security_group else \
+                ec2.SecurityGroup(self, "SecurityGroup",
+                                  vpc=vpc,
+                                  allow_all_outbound=True)
+            for port in ports or []:
+                self.security_group.add_ingress_rule(
+                    peer=ec2.Peer.ipv4(vpc.vpc_cidr_block),
+                    connection=ec2.Port.tcp(port)
+                )
+        elif use_dynamic_ports and ports:
+            ec2_cluster.security_group.add_ingress_rule(
+                peer=ec2.Peer.ipv4(vpc.vpc_cidr_block),
+                connection=ec2.Port.tcp_range(EPHEMERAL_PORT_RANGE[0], EPHEMERAL_PORT_RANGE[1]),
+                description="ECS dynamic host ports"
+            )
+
         port_mappings = port_mappings if ports else None
+
+        if memory_limit_mib is not None and memory_limit_mib < task_memory_mib:
+            raise ValueError("memory_limit_mib must not be lower than task_memory_mib (the soft limit)")
+        if swappiness is not None and max_swap_mib is None:
+            raise ValueError("swappiness requires max_swap_mib")
+
+        linux_parameters = None
+        if any(p is not None for p in (shared_memory_size_mib, init_process_enabled, max_swap_mib, tmpfs_mounts)):
+            linux_parameters = ecs.LinuxParameters(self, "LinuxParameters",
+                                                   shared_memory_size=shared_memory_size_mib,
+                                                   init_process_enabled=init_process_enabled,
+                                                   max_swap=cdk.Size.mebibytes(max_swap_mib) if max_swap_mib is not None else None,
+                                                   swappiness=swappiness)
+            # in-memory scratch space, counted against the container's memory
+            linux_parameters.add_tmpfs(*(tmpfs_mounts or []))
+
         self.container_name = container_name
         self.container = self.task_definition.add_container(id=self.container_name,
                                                             image=container_image,
                                                             port_mappings=port_mappings,
                                                             environment=container_environment,
+                                                            cpu=task_cpu,
                                                             memory_reservation_mib=task_memory_mib,
-                                                            logging=ecs.LogDrivers.aws_logs(
-                                                                log_group=self.log_group,
-                                                                stream_prefix="ecs"
-                                                            ),
+                                                            memory_limit_mib=memory_limit_mib,
+                                                            ulimits=ulimits,
+                                                            linux_parameters=linux_parameters,
+                                                            logging=build_log_driver(self.task_definition,
+                                                                                     self.log_group,
+                                                                                     id,
+                                                                                     log_options,
+                                                                                     camel_case_id if fleet else "ecs"),
                                                             command=command,
+                                                            health_check=container_health_check,
                                                             secrets=secrets)
-
+        add_bind_mounts(self.task_definition, self.container, bind_mounts or {})
+
+        cloud_map_options = service_connect_configuration = None
+        self.discovery_name = None
+        if service_discovery_options:
+            self.discovery_name = service_discovery_options.discovery_name or camel_case_id
+            cloud_map_options, service_connect_configuration = configure_service_discovery(
+                ec2_cluster.cluster, self.log_group, self.container, self.discovery_name,
+                {m.container_port: m.name for m in port_mappings or []}, network_mode,
+                service_discovery_options)
+
+        # a failing deployment is rolled back by the circuit breaker instead of retrying until
+        # CloudFormation times out
         self.service = ecs.Ec2Service(self, "Service",
                                       cluster=ec2_cluster.cluster,
                                       service_name=id,
                                       task_definition=self.task_definition,
+                                      desired_count=desired_count,
+                                      placement_strategies=placement_strategies,
+                                      placement_constraints=placement_constraints,
+                                      min_healthy_percent=min_healthy_percent,
+                                      max_healthy_percent=max_healthy_percent,
+                                      health_check_grace_period=cdk.Duration.seconds(health_check_grace_period_seconds)
+                                      if health_check_grace_period_seconds is not None else None,
+                                      circuit_breaker=ecs.DeploymentCircuitBreaker(enable=True, rollback=True)
+                                      if enable_circuit_breaker else None,
+                                      security_groups=[self.security_group] if self.security_group else None,
+                                      vpc_subnets=subnets if is_awsvpc else None,
+                                      cloud_map_options=cloud_map_options,
+                                      service_connect_configuration=service_connect_configuration,
                                       capacity_provider_strategies=[ecs.CapacityProviderStrategy(
                                           capacity_provider=ec2_cluster.capacity_provider.capacity_provider_name,
                                           weight=1)])
 
-        CfnOutput(self, 'ServiceTaskDefinition', value=self.service.task_definition.task_definition_arn)
-        CfnOutput(self, 'ServiceLogs', value=self.log_group.log_group_arn)
+        self.load_balancer = self.listener = self.target_group = None
+        if load_balancer_options:
+            container_port = load_balancer_options.container_port or (ports[0] if ports else None)
+            if not container_port:
+                raise ValueError("load_balancer_options needs a container_port or service ports")
+            self.load_balancer, self.listener, self.target_group = attach_load_balancer(
+                self, vpc, self.service, self.container_name, container_port, load_balancer_options,
+                targets_connectable=None if is_awsvpc else ec2_cluster.security_group,
+                target_port_range=ec2.Port.tcp_range(EPHEMERAL_PORT_RANGE[0], EPHEMERAL_PORT_RANGE[1])
+                if use_dynamic_ports else None)
+
+        if vpc_endpoints:
+            vpc_endpoints.add_dependents(self.service)
+
+        # max_task_count is the upper bound (e.g. of task autoscaling) the capacity planner checks
+        # without desired_count the service keeps its running count across deploys; the plan
+        # assumes the single task ECS starts a new service with
+        planned_count = desired_count if desired_count is not None else 1
+        if max_task_count is not None and max_task_count < planned_count:
+            raise ValueError("max_task_count must not be lower than desired_count")
+        ec2_cluster.services.append(PlannedService(
+            name=id,
+            # without a reservation the container only shares the CPU with the others
+            cpu=task_cpu or 0,
+            # ECS reserves the soft limit, the hard limit is only enforced on the container
+            memory_mib=task_memory_mib + (FIRELENS_ROUTER_MEMORY_MIB if log_options and log_options.firelens else 0),
+            desired_count=planned_count,
+            max_count=max_task_count if max_task_count is not None else planned_count,
+            awsvpc=is_awsvpc,
+            host_ports=tuple(ports or []) if not (is_awsvpc or use_dynamic_ports) else ()
+        ))
+
+        # a fleet of services would otherwise emit two outputs each
+        if not fleet:
+            CfnOutput(self, 'ServiceTaskDefinition', value=self.service.task_definition.task_definition_arn)
+            CfnOutput(self, 'ServiceLogs', value=self.log_group.log_group_arn)
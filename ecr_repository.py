@@ -1,13 +1,132 @@
 from pathlib import Path
 
+import aws_cdk.aws_codebuild as codebuild
 import aws_cdk.aws_iam as iam
-from aws_cdk import CfnOutput, Stack
+import aws_cdk.aws_lambda as lambda_
+from aws_cdk import CfnOutput, CustomResource, Duration, Stack, Token
+from aws_cdk import custom_resources as cr
 from aws_cdk.aws_ecr import LifecycleRule, Repository
-from aws_cdk.aws_ecr_assets import DockerImageAsset, Platform
+from aws_cdk.aws_ecr_assets import DockerCacheOption, DockerImageAsset
 from cdk_ecr_deployment import DockerImageName, ECRDeployment
 from constructs import Construct
 
-from typing import Optional, List, Dict
+from .architecture import Architecture
+
+from typing import Optional, List, Dict, Sequence, Tuple
+
+HANDLERS_PATH = Path(__file__).parent / "handlers"
+
+BUILD_CACHE_TAG = "buildcache"
+
+SOCI_VERSION = "0.9.0"
+SOCI_MIN_LAYER_SIZE_MIB = 10
+
+
+def _image_tag_provider(scope: Construct) -> cr.Provider:
+    # one tagging function per stack, shared by every repository in it
+    stack = Stack.of(scope)
+    provider = stack.node.try_find_child("ECRImageTagProvider")
+    if provider is None:
+        on_event = lambda_.Function(stack, "ECRImageTagFunction",
+                                    runtime=lambda_.Runtime.PYTHON_3_12,
+                                    handler="index.on_event",
+                                    code=lambda_.Code.from_asset(str(HANDLERS_PATH / "image_tags")),
+                                    timeout=Duration.minutes(1))
+        provider = cr.Provider(stack, "ECRImageTagProvider", on_event_handler=on_event)
+    return provider
+
+
+def _build_cache(architecture: Architecture,
+                 repository_name: str,
+                 cache_from: Optional[Sequence[DockerCacheOption]],
+                 cache_to: Optional[DockerCacheOption],
+                 registry_cache_repository_uri: Optional[str],
+                 local_cache_dir: Optional[str]) -> Tuple[List[DockerCacheOption], Optional[DockerCacheOption]]:
+    # cache_from/cache_to are used as given, registry_cache_repository_uri and local_cache_dir
+    # are shorthands. Only one cache export is supported by docker build, registry wins.
+    # The registry cache goes to an existing repository, the one created by the stack does
+    # not exist yet when the image of the first deploy is built. One cache repository can
+    # serve several image repositories, and every architecture gets its own tag or directory
+    # so the builds of a multi-architecture image do not overwrite each other's cache.
+    cache_from = list(cache_from or [])
+    if registry_cache_repository_uri:
+        cache_ref = (f"{registry_cache_repository_uri}:"
+                     f"{repository_name.replace('/', '-')}-{BUILD_CACHE_TAG}-{architecture.value}")
+        cache_from.append(DockerCacheOption(type="registry", params={"ref": cache_ref}))
+        cache_to = cache_to or DockerCacheOption(type="registry",
+                                                 params={"ref": cache_ref,
+                                                         "mode": "max",
+                                                         "image-manifest": "true",
+                                                         "oci-mediatypes": "true"})
+    if local_cache_dir:
+        cache_dir = str(Path(local_cache_dir) / architecture.value)
+        cache_from.append(DockerCacheOption(type="local", params={"src": cache_dir}))
+        cache_to = cache_to or DockerCacheOption(type="local", params={"dest": cache_dir, "mode": "max"})
+    return cache_from, cache_to
+
+
+def _soci_index_builder(scope: Construct) -> Tuple[codebuild.Project, cr.Provider]:
+    # one index build project and provider per stack, shared by every repository in it.
+    # The build pulls the image into containerd and runs the soci CLI to create the index and
+    # push it as a referrer of the image; the digests are exported for the completion check.
+    stack = Stack.of(scope)
+    provider = stack.node.try_find_child("SociIndexProvider")
+    if provider is None:
+        project = codebuild.Project(stack, "SociIndexProject",
+                                    environment=codebuild.BuildEnvironment(
+                                        build_image=codebuild.LinuxBuildImage.STANDARD_7_0,
+                                        privileged=True
+                                    ),
+                                    environment_variables={
+                                        "SOCI_VERSION": codebuild.BuildEnvironmentVariable(value=SOCI_VERSION)
+                                    },
+                                    build_spec=codebuild.BuildSpec.from_object({
+                                        "version": "0.2",
+                                        "env": {"exported-variables": ["SOCI_INDEX_DIGESTS"]},
+                                        "phases": {
+                                            "install": {"commands": [
+                                                "curl -sSL https://github.com/awslabs/soci-snapshotter/releases/download/"
+                                                "v${SOCI_VERSION}/soci-snapshotter-${SOCI_VERSION}-linux-amd64.tar.gz"
+                                                " | tar -xz -C /usr/local/bin soci",
+                                                "nohup containerd > /tmp/containerd.log 2>&1 &",
+                                                "sleep 5"
+                                            ]},
+                                            "build": {"commands": [
+                                                "PASSWORD=$(aws ecr get-login-password --region $AWS_REGION)",
+                                                "ctr image pull --user AWS:$PASSWORD $PLATFORM_FLAGS $IMAGE_REF",
+                                                "soci create --min-layer-size $MIN_LAYER_SIZE $PLATFORM_FLAGS $IMAGE_REF",
+                                                "soci push --user AWS:$PASSWORD $PLATFORM_FLAGS $IMAGE_REF",
+                                                "export SOCI_INDEX_DIGESTS=$(soci index list --ref $IMAGE_REF -q | paste -sd, -)"
+                                            ]}
+                                        }
+                                    }),
+                                    timeout=Duration.minutes(60))
+        project.add_to_role_policy(iam.PolicyStatement(actions=["ecr:GetAuthorizationToken"],
+                                                       resources=["*"]))
+
+        handler_code = lambda_.Code.from_asset(str(HANDLERS_PATH / "soci_index"))
+        on_event = lambda_.Function(stack, "SociIndexFunction",
+                                    runtime=lambda_.Runtime.PYTHON_3_12,
+                                    handler="index.on_event",
+                                    code=handler_code,
+                                    timeout=Duration.minutes(1))
+        is_complete = lambda_.Function(stack, "SociIndexCompleteFunction",
+                                       runtime=lambda_.Runtime.PYTHON_3_12,
+                                       handler="index.is_complete",
+                                       code=handler_code,
+                                       timeout=Duration.minutes(1))
+        on_event.add_to_role_policy(iam.PolicyStatement(actions=["codebuild:StartBuild"],
+                                                        resources=[project.project_arn]))
+        is_complete.add_to_role_policy(iam.PolicyStatement(actions=["codebuild:BatchGetBuilds"],
+                                                           resources=[project.project_arn]))
+        provider = cr.Provider(stack, "SociIndexProvider",
+                               on_event_handler=on_event,
+                               is_complete_handler=is_complete,
+                               query_interval=Duration.seconds(30),
+                               total_timeout=Duration.hours(1))
+    project = stack.node.find_child("SociIndexProject")
+    return project, provider
+
 
 class ECRRepository(Construct):
     ecr_repo: Repository
@@ -22,10 +141,26 @@ class ECRRepository(Construct):
             workload_accounts: List[str] = [],
             function_name_pattern: Optional[str] = None,
             build_args: Optional[Dict] = None,
+            additional_tags: Sequence[str] = ("latest",),
+            registry_cache_repository_uri: Optional[str] = None,
+            local_cache_dir: Optional[str] = None,
+            cache_from: Optional[Sequence[DockerCacheOption]] = None,
+            cache_to: Optional[DockerCacheOption] = None,
+            target: Optional[str] = None,
+            build_secrets: Optional[Dict[str, str]] = None,
+            outputs: Optional[Sequence[str]] = None,
+            architectures: Sequence[Architecture] = (Architecture.X86_64,),
+            soci_index: bool = False,
+            soci_min_layer_size_mib: int = SOCI_MIN_LAYER_SIZE_MIB,
             **kwargs
     ) -> None:
         super().__init__(scope, id)
 
+        # one image per distinct architecture, in the order given
+        architectures = list(dict.fromkeys(architectures))
+        if not architectures:
+            raise ValueError("architectures must name at least one architecture")
+
         self.ecr_repo = Repository(self, f'{repository_name}Repository',
           repository_name=repository_name,
           image_scan_on_push=True,
@@ -103,23 +238,78 @@ class ECRRepository(Construct):
             )
             self.ecr_repo.add_to_resource_policy(lambda_policy)
 
-        image = DockerImageAsset(self, f'{repository_name}DockerImage',
-                                 directory=str(code_path),
-                                 platform=Platform.LINUX_AMD64,
-                                 build_args=build_args
-        )
-        ECRDeployment(self,
-                      'VersionedEcrDeployment',
-                      src=DockerImageName(image.image_uri),
-                      dest=DockerImageName(f'{self.ecr_repo.repository_uri}:{image_tag}'),
-                      )
-
-        ECRDeployment(self,
-                      'LatestEcrDeployment',
-                      src=DockerImageName(image.image_uri),
-                      dest=DockerImageName(f'{self.ecr_repo.repository_uri}:latest'),
-                      )
+        # images are built before the deploy, so the cache repository URI cannot come from a resource
+        if registry_cache_repository_uri and Token.is_unresolved(registry_cache_repository_uri):
+            raise ValueError("registry_cache_repository_uri must be a literal repository URI")
+
+        # one image per architecture; with several architectures the tags point at a
+        # manifest list assembled from the per-architecture images
+        self.image_assets: Dict[Architecture, DockerImageAsset] = dict()
+        sources = list()
+        image_copies = list()
+        for architecture in architectures:
+            suffix = architecture.name if len(architectures) > 1 else ""
+            image_cache_from, image_cache_to = _build_cache(architecture, repository_name, cache_from, cache_to,
+                                                            registry_cache_repository_uri, local_cache_dir)
+            image = DockerImageAsset(self, f'{repository_name}DockerImage{suffix}',
+                                     directory=str(code_path),
+                                     platform=architecture.platform,
+                                     build_args=build_args,
+                                     cache_from=image_cache_from or None,
+                                     cache_to=image_cache_to,
+                                     target=target,
+                                     build_secrets=build_secrets,
+                                     outputs=outputs
+            )
+            self.image_assets[architecture] = image
+
+            # copy the layers once, to a tag derived from the asset hash. The copy only runs again
+            # when the image content changes; the human readable tags are then pointed at the
+            # copied manifest, which does not move any layers.
+            image_copies.append(ECRDeployment(self,
+                                              f'EcrDeployment{suffix}',
+                                              src=DockerImageName(image.image_uri),
+                                              dest=DockerImageName(f'{self.ecr_repo.repository_uri}:{image.image_tag}'),
+                                              image_arch=[architecture.value],
+                                              ))
+            sources.append({"Tag": image.image_tag, "Architecture": architecture.value})
+        self.image_asset = next(iter(self.image_assets.values()))
+
+        tags = list(dict.fromkeys([image_tag, *additional_tags]))
+        provider = _image_tag_provider(self)
+        self.ecr_repo.grant(provider.on_event_handler, "ecr:BatchGetImage", "ecr:PutImage")
+        image_tags = CustomResource(self, 'ImageTags',
+                                    service_token=provider.service_token,
+                                    properties={
+                                        "RepositoryName": self.ecr_repo.repository_name,
+                                        "Sources": sources,
+                                        "Tags": tags
+                                    })
+        for image_copy in image_copies:
+            image_tags.node.add_dependency(image_copy)
+        self.image_digest = image_tags.get_att_string("ImageDigest")
+
+        # SOCI index next to the tagged image so Fargate can lazy load it. All tags point at
+        # the same digest, so a single index (one per platform) covers them.
+        if soci_index:
+            project, soci_provider = _soci_index_builder(self)
+            self.ecr_repo.grant_pull_push(project)
+            self.ecr_repo.grant(soci_provider.is_complete_handler, "ecr:BatchGetImage")
+            soci = CustomResource(self, 'SociIndex',
+                                  service_token=soci_provider.service_token,
+                                  properties={
+                                      "ProjectName": project.project_name,
+                                      "RepositoryName": self.ecr_repo.repository_name,
+                                      "RepositoryUri": self.ecr_repo.repository_uri,
+                                      "ImageDigest": self.image_digest,
+                                      "PlatformFlags": "--all-platforms" if len(self.image_assets) > 1 else "",
+                                      "MinLayerSize": soci_min_layer_size_mib * 1024 * 1024
+                                  })
+            CfnOutput(self, 'SociIndexSizeBytes', value=soci.get_att_string("IndexSizeBytes"))
+            CfnOutput(self, 'SociLayerCoverage', value=soci.get_att_string("LayerCoverage"))
+            CfnOutput(self, 'SociIndexedLayers', value=soci.get_att_string("IndexedLayers"))
 
         CfnOutput(self, 'ImageUri', value=self.ecr_repo.repository_uri)
         CfnOutput(self, 'ImageTag', value=image_tag)
+        CfnOutput(self, 'ImageDigest', value=self.image_digest)
         CfnOutput(self, 'RepositoryArn', value=self.ecr_repo.repository_arn)
@@ -11,6 +11,12 @@ from aws_cdk import (
 )
 import os
 
+from typing import Optional
+
+from .load_balancing import LoadBalancerOptions, attach_load_balancer
+from .log_options import LogOptions, build_log_driver
+from .vpc_endpoints import ServiceEndpoints
+
 SERVICE_PORT = 80
 
 class SimpleEC2Service(Construct):
@@ -21,6 +27,14 @@ class SimpleEC2Service(Construct):
                  instance_type: str,
                  max_capacity: int,
                  desired_capacity: int,
+                 log_options: Optional[LogOptions] = None,
+                 load_balancer_options: Optional[LoadBalancerOptions] = None,
+                 min_healthy_percent: Optional[int] = None,
+                 max_healthy_percent: Optional[int] = None,
+                 health_check_grace_period_seconds: Optional[int] = None,
+                 enable_circuit_breaker: bool = False,
+                 container_health_check: Optional[ecs.HealthCheck] = None,
+                 vpc_endpoints: Optional[ServiceEndpoints] = None,
                  **kwargs) -> None:
         super().__init__(scope, id)
 
@@ -48,10 +62,12 @@ class SimpleEC2Service(Construct):
         security_group = ec2.SecurityGroup(self, "SG",
                                            vpc=vpc,
                                            allow_all_outbound=True)
-        security_group.add_ingress_rule(
-            peer=ec2.Peer.any_ipv4(),
-            connection=ec2.Port.tcp(SERVICE_PORT)
-        )
+        # behind a load balancer only the load balancer may reach the service port
+        if not load_balancer_options:
+            security_group.add_ingress_rule(
+                peer=ec2.Peer.any_ipv4(),
+                connection=ec2.Port.tcp(SERVICE_PORT)
+            )
         if associate_public_ip:
             subnets = ec2.SubnetSelection(subnet_type=ec2.SubnetType.PUBLIC)
             security_group.add_ingress_rule(
@@ -95,18 +111,36 @@ class SimpleEC2Service(Construct):
                                         name=f"web-example-port",
                                         protocol=ecs.Protocol.TCP
                                         )],
-                                      logging=ecs.LogDrivers.aws_logs(
-                                          log_group=self.log_group,
-                                          stream_prefix="ecs"
-                                      ))
+                                      logging=build_log_driver(task_definition,
+                                                               self.log_group,
+                                                               id,
+                                                               log_options),
+                                      health_check=container_health_check)
         self.service_port = SERVICE_PORT
         self.service = ecs.Ec2Service(self, "EC2Service",
                        cluster=self.cluster,
                        task_definition=task_definition,
+                       min_healthy_percent=min_healthy_percent,
+                       max_healthy_percent=max_healthy_percent,
+                       health_check_grace_period=cdk.Duration.seconds(health_check_grace_period_seconds)
+                       if health_check_grace_period_seconds is not None else None,
+                       circuit_breaker=ecs.DeploymentCircuitBreaker(enable=True, rollback=True)
+                       if enable_circuit_breaker else None,
                        capacity_provider_strategies=[ecs.CapacityProviderStrategy(
                            capacity_provider=self.capacity_provider.capacity_provider_name,
                            weight=1
                        )])
 
+        self.load_balancer = self.listener = self.target_group = None
+        if load_balancer_options:
+            self.load_balancer, self.listener, self.target_group = attach_load_balancer(
+                self, vpc, self.service, self.container_name, SERVICE_PORT, load_balancer_options,
+                targets_connectable=security_group)
+
+        # instances in isolated subnets reach ECR, CloudWatch and the ECS agent endpoints
+        # only through VPC endpoints
+        if vpc_endpoints:
+            vpc_endpoints.add_dependents(self.auto_scaling_group, self.service)
+
         CfnOutput(self, f"{id}CapacityProviderName", value=self.capacity_provider.capacity_provider_name)
         CfnOutput(self, f"{id}ClusterName", value=self.cluster.cluster_name)
\ No newline at end of file
@@ -7,12 +7,26 @@ from aws_cdk import aws_logs as logs
 from aws_cdk import aws_ecs as ecs
 from aws_cdk import aws_ec2 as ec2
 from aws_cdk import aws_ecr as ecr
+from aws_cdk import aws_cloudwatch as cloudwatch
+from aws_cdk import aws_applicationautoscaling as appscaling
+from aws_cdk import aws_elasticloadbalancingv2 as elbv2
+from aws_cdk import aws_sqs as sqs
 
 import re
 import os
 
+from .architecture import Architecture
+from .fleet import Fleet
+from .load_balancing import LoadBalancerOptions, attach_load_balancer
+from .log_options import LogOptions, build_log_driver
+from .service_discovery import ServiceDiscoveryOptions, configure_service_discovery
+from .storage import MAX_EPHEMERAL_STORAGE_GIB, MIN_EPHEMERAL_STORAGE_GIB, EfsVolumeOptions, add_efs_volumes
+from .vpc_endpoints import ServiceEndpoints
+
 from typing import Optional, Sequence, Mapping, Union
 
+DEFAULT_SCALING_COOLDOWN_SECONDS = 60
+
 class ECSService(Construct):
     def __init__(self, scope: Construct, id: str,
                  vpc: ec2.IVpc,
@@ -28,21 +42,52 @@ class ECSService(Construct):
                  container_environment: Optional[Mapping[str, str]] = None,
                  command: Optional[Sequence[str]] = None,
                  secrets: Optional[Mapping[str, ecs.Secret]] = None,
+                 capacity_provider_strategies: Optional[Sequence[ecs.CapacityProviderStrategy]] = None,
+                 container_cpu: Optional[int] = None,
+                 container_memory_limit_mib: Optional[int] = None,
+                 ulimits: Optional[Sequence[ecs.Ulimit]] = None,
+                 init_process_enabled: Optional[bool] = None,
+                 architecture: Optional[Architecture] = None,
+                 log_options: Optional[LogOptions] = None,
+                 load_balancer_options: Optional[LoadBalancerOptions] = None,
+                 min_healthy_percent: Optional[int] = None,
+                 max_healthy_percent: Optional[int] = None,
+                 health_check_grace_period_seconds: Optional[int] = None,
+                 enable_circuit_breaker: bool = False,
+                 container_health_check: Optional[ecs.HealthCheck] = None,
+                 assign_public_ip: bool = True,
+                 service_discovery_options: Optional[ServiceDiscoveryOptions] = None,
+                 vpc_endpoints: Optional[ServiceEndpoints] = None,
+                 ephemeral_storage_gib: Optional[int] = None,
+                 efs_volumes: Optional[Mapping[str, EfsVolumeOptions]] = None,
+                 fleet: Optional[Fleet] = None,
                  **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
-        self.log_group = logs.LogGroup(self, "Logs",
-                                       retention=logs.RetentionDays.ONE_WEEK,
-                                       removal_policy=cdk.RemovalPolicy.DESTROY)
-
         # camel to hyphenated case
         _id = re.sub(r'(?<!^)(?=[A-Z])', '-', id).lower()
+
+        # in a fleet each service only writes its own stream prefix to the shared group
+        self.fleet = fleet
+        self.log_group = fleet.log_group if fleet else logs.LogGroup(self, "Logs",
+                                                                     retention=logs.RetentionDays.ONE_WEEK,
+                                                                     removal_policy=cdk.RemovalPolicy.DESTROY)
         task_def_id = task_family_name if task_family_name else _id
+        if ephemeral_storage_gib is not None and \
+                not MIN_EPHEMERAL_STORAGE_GIB <= ephemeral_storage_gib <= MAX_EPHEMERAL_STORAGE_GIB:
+            raise ValueError(f"ephemeral_storage_gib must be between {MIN_EPHEMERAL_STORAGE_GIB} "
+                             f"and {MAX_EPHEMERAL_STORAGE_GIB}")
         self.task_definition = ecs.TaskDefinition(self, "TaskDefinition",
                                                   family=task_def_id,
                                                   compatibility=ecs.Compatibility.EC2_AND_FARGATE,
                                                   cpu=task_cpu,
-                                                  memory_mib=task_memory_mib,)
+                                                  memory_mib=task_memory_mib,
+                                                  ephemeral_storage_gib=ephemeral_storage_gib,
+                                                  execution_role=fleet.execution_role if fleet else None,
+                                                  runtime_platform=ecs.RuntimePlatform(
+                                                      cpu_architecture=architecture.cpu_architecture,
+                                                      operating_system_family=ecs.OperatingSystemFamily.LINUX
+                                                  ) if architecture else None)
 
         port_mapping = ecs.PortMapping(
             container_port=port,
@@ -51,34 +96,161 @@ class ECSService(Construct):
             protocol=ecs.Protocol.TCP
         ) if port else None
 
-        self.security_group = ec2.SecurityGroup(self, "SecurityGroup",
-                                                vpc=vpc,
-                                                allow_all_outbound=True
-                                                )
+        if fleet and fleet.security_group:
+            self.security_group = fleet.security_group
+        else:
+            self.security_group = ec2.SecurityGroup(self, "SecurityGroup",
+                                                    vpc=vpc,
+                                                    allow_all_outbound=True
+                                                    )
         
         self.container_image = ecs.ContainerImage.from_ecr_repository(repository, tag=image_tag) 
 
+        # shared memory size and swap are not supported on Fargate, so only the init process is exposed
+        linux_parameters = ecs.LinuxParameters(self, "LinuxParameters",
+                                               init_process_enabled=init_process_enabled
+                                               ) if init_process_enabled is not None else None
+
         self.container = self.task_definition.add_container(id=id,
                                                             image=self.container_image,
-                                                            port_mappings=[port_mapping],
+                                                            port_mappings=[port_mapping] if port_mapping else None,
                                                             environment=container_environment,
                                                             essential=True,
-                                                            logging=ecs.LogDrivers.aws_logs(
-                                                                log_group=self.log_group,
-                                                                stream_prefix="ecs"
-                                                            ),
+                                                            cpu=container_cpu,
+                                                            memory_limit_mib=container_memory_limit_mib,
+                                                            ulimits=ulimits,
+                                                            linux_parameters=linux_parameters,
+                                                            logging=build_log_driver(self.task_definition,
+                                                                                     self.log_group,
+                                                                                     id,
+                                                                                     log_options,
+                                                                                     _id if fleet else "ecs"),
                                                             command=command,
+                                                            health_check=container_health_check,
                                                             secrets=secrets)
 
+        # shared datasets on EFS, reachable from the service security group on the NFS port
+        self.file_systems = add_efs_volumes(self, vpc, self.task_definition, self.container,
+                                            self.security_group, efs_volumes or {})
+
+        # FARGATE / FARGATE_SPOT strategies need the providers associated with the cluster
+        if capacity_provider_strategies:
+            cluster.enable_fargate_capacity_providers()
+
+        # services in the same namespace reach each other by name inside the VPC
+        cloud_map_options = service_connect_configuration = None
+        self.discovery_name = None
+        if service_discovery_options:
+            self.discovery_name = service_discovery_options.discovery_name or _id
+            cloud_map_options, service_connect_configuration = configure_service_discovery(
+                cluster, self.log_group, self.container, self.discovery_name,
+                {port: _id} if port else {}, ecs.NetworkMode.AWS_VPC, service_discovery_options)
+
         self.service = ecs.FargateService(self, "Service",
                                           cluster=cluster,
                                           service_name=id,
                                           task_definition=self.task_definition,
                                           security_groups=[self.security_group],
                                           vpc_subnets=subnets,
-                                          assign_public_ip=True,
-                                          desired_count=container_count)
+                                          assign_public_ip=assign_public_ip,
+                                          desired_count=container_count,
+                                          capacity_provider_strategies=capacity_provider_strategies,
+                                          min_healthy_percent=min_healthy_percent,
+                                          max_healthy_percent=max_healthy_percent,
+                                          health_check_grace_period=cdk.Duration.seconds(health_check_grace_period_seconds)
+                                          if health_check_grace_period_seconds is not None else None,
+                                          circuit_breaker=ecs.DeploymentCircuitBreaker(enable=True, rollback=True)
+                                          if enable_circuit_breaker else None,
+                                          cloud_map_options=cloud_map_options,
+                                          service_connect_configuration=service_connect_configuration)
+
+        self.load_balancer = self.listener = self.target_group = None
+        if load_balancer_options:
+            container_port = load_balancer_options.container_port or port
+            if not container_port:
+                raise ValueError("load_balancer_options needs a container_port or service port")
+            self.load_balancer, self.listener, self.target_group = attach_load_balancer(
+                self, vpc, self.service, id, container_port, load_balancer_options)
+
+        if vpc_endpoints:
+            vpc_endpoints.add_dependents(self.service)
+
+        # a fleet of services would otherwise emit two outputs each
+        if not fleet:
+            CfnOutput(self, 'ServiceTaskDefinition', value=self.service.task_definition.task_definition_arn)
+            CfnOutput(self, 'ServiceLogs', value=self.log_group.log_group_arn)
+
+    def add_autoscaling(self,
+                        min_task_count: int,
+                        max_task_count: int,
+                        target_cpu_utilization: Optional[int] = None,
+                        target_memory_utilization: Optional[int] = None,
+                        target_requests_per_task: Optional[int] = None,
+                        target_group: Optional[elbv2.ApplicationTargetGroup] = None,
+                        step_metric: Optional[cloudwatch.IMetric] = None,
+                        queue: Optional[sqs.IQueue] = None,
+                        step_intervals: Optional[Sequence[appscaling.ScalingInterval]] = None,
+                        scale_in_cooldown: Optional[cdk.Duration] = None,
+                        scale_out_cooldown: Optional[cdk.Duration] = None) -> ecs.ScalableTaskCount:
+        scale_in_cooldown = scale_in_cooldown or cdk.Duration.seconds(DEFAULT_SCALING_COOLDOWN_SECONDS)
+        scale_out_cooldown = scale_out_cooldown or cdk.Duration.seconds(DEFAULT_SCALING_COOLDOWN_SECONDS)
+
+        self.scalable_task_count = self.service.auto_scale_task_count(min_capacity=min_task_count,
+                                                                      max_capacity=max_task_count)
+
+        if target_cpu_utilization:
+            self.scalable_task_count.scale_on_cpu_utilization("CpuScaling",
+                                                              target_utilization_percent=target_cpu_utilization,
+                                                              scale_in_cooldown=scale_in_cooldown,
+                                                              scale_out_cooldown=scale_out_cooldown)
+
+        if target_memory_utilization:
+            self.scalable_task_count.scale_on_memory_utilization("MemoryScaling",
+                                                                 target_utilization_percent=target_memory_utilization,
+                                                                 scale_in_cooldown=scale_in_cooldown,
+                                                                 scale_out_cooldown=scale_out_cooldown)
+
+        if target_requests_per_task:
+            if not target_group and isinstance(self.target_group, elbv2.ApplicationTargetGroup):
+                target_group = self.target_group
+            if not target_group:
+                raise ValueError("target_requests_per_task requires the service's ALB target_group")
+            self.scalable_task_count.scale_on_request_count("RequestCountScaling",
+                                                            requests_per_target=target_requests_per_task,
+                                                            target_group=target_group,
+                                                            scale_in_cooldown=scale_in_cooldown,
+                                                            scale_out_cooldown=scale_out_cooldown)
+
+        # queue backlog per task: visible messages divided by running tasks, where the
+        # SampleCount of the service CPU metric is the number of running tasks
+        if queue and not step_metric:
+            step_metric = cloudwatch.MathExpression(
+                expression="backlog / IF(tasks > 0, tasks, 1)",
+                using_metrics={
+                    "backlog": queue.metric_approximate_number_of_messages_visible(
+                        period=cdk.Duration.minutes(1)),
+                    "tasks": self.service.metric_cpu_utilization(
+                        statistic=cloudwatch.Stats.SAMPLE_COUNT,
+                        period=cdk.Duration.minutes(1))
+                },
+                label="Backlog per task",
+                period=cdk.Duration.minutes(1)
+            )
 
-        CfnOutput(self, 'ServiceTaskDefinition', value=self.service.task_definition.task_definition_arn)
-        CfnOutput(self, 'ServiceLogs', value=self.log_group.log_group_arn)
+        if step_metric:
+            if not step_intervals:
+                raise ValueError("step scaling requires step_intervals")
+            self.scalable_task_count.scale_on_metric("StepScaling",
+                                                     metric=step_metric,
+                                                     scaling_steps=step_intervals,
+                                                     adjustment_type=appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+                                                     cooldown=scale_out_cooldown)
+            # step scaling takes one cooldown for both directions; the lower (scale-in) policy,
+            # present when there are steps below the alarm threshold, gets its own
+            step_policy = self.scalable_task_count.node.find_child("Target").node.find_child("StepScaling")
+            lower_policy = step_policy.node.try_find_child("LowerPolicy")
+            if lower_policy:
+                lower_policy.node.default_child.add_property_override(
+                    "StepScalingPolicyConfiguration.Cooldown", scale_in_cooldown.to_seconds())
 
+        return self.scalable_task_count
@@ -0,0 +1,90 @@
+from typing import List, Optional
+
+import aws_cdk as cdk
+from aws_cdk import CfnOutput
+from aws_cdk import (
+    aws_ec2 as ec2,
+    aws_iam as iam,
+    aws_logs as logs
+)
+from constructs import Construct
+
+# a fleet service is a task definition, a service and a task role, plus a few resources per
+# load balancer or discovery option; 25 of them stay well below CloudFormation's 500
+DEFAULT_SERVICES_PER_STACK = 25
+
+
+class Fleet(Construct):
+    """Infrastructure shared by many EC2Service / ECSService constructs.
+
+    Services created with fleet=... use the fleet's log group (one stream prefix per service),
+    its task execution role and, with share_security_group, its security group, and emit no
+    outputs of their own. add_service() creates them in nested stacks of services_per_stack
+    services each, which CloudFormation deploys in parallel.
+    """
+
+    def __init__(self, scope: Construct, id: str,
+                 vpc: ec2.IVpc,
+                 services_per_stack: Optional[int] = DEFAULT_SERVICES_PER_STACK,
+                 log_retention: logs.RetentionDays = logs.RetentionDays.ONE_WEEK,
+                 share_security_group: bool = True,
+                 **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+
+        if services_per_stack is not None and services_per_stack < 1:
+            raise ValueError("services_per_stack must be at least 1")
+        self.services_per_stack = services_per_stack
+
+        self.log_group = logs.LogGroup(self, "Logs",
+                                       retention=log_retention,
+                                       removal_policy=cdk.RemovalPolicy.DESTROY)
+
+        # repositories and secrets are added by the services as they are created
+        self.execution_role = iam.Role(self, "TaskExecutionRole",
+                                       assumed_by=iam.CompositePrincipal(
+                                           iam.ServicePrincipal("ecs.amazonaws.com"),
+                                           iam.ServicePrincipal("ecs-tasks.amazonaws.com")
+                                       ))
+        self.log_group.grant_write(self.execution_role)
+
+        # awsvpc tasks of every service share it, so ingress opened for one service is open
+        # for all of them
+        self.security_group = ec2.SecurityGroup(self, "SecurityGroup",
+                                                vpc=vpc,
+                                                allow_all_outbound=True) if share_security_group else None
+
+        self.stacks: List[cdk.NestedStack] = []
+        self.service_count = 0
+
+        CfnOutput(self, "FleetLogs", value=self.log_group.log_group_arn)
+
+    def service_scope(self) -> Construct:
+        # fills one nested stack before opening the next, so adding a service never moves
+        # the existing ones
+        if self.services_per_stack is None:
+            scope = self
+        else:
+            index = self.service_count // self.services_per_stack
+            if index == len(self.stacks):
+                self.stacks.append(cdk.NestedStack(self, f"Services{index}"))
+            scope = self.stacks[index]
+        self.service_count += 1
+        return scope
+
+    def add_service(self, service_class: type, id: str, **kwargs) -> Construct:
+        """Creates e.g. an EC2Service or ECSService in the next shard."""
+        return service_class(self.service_scope(), id, fleet=self, **kwargs)
+
+    def grant_secret_read(self, secret_arn: str) -> None:
+        self.execution_role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "secretsmanager:DescribeSecret",
+                    "secretsmanager:GetResourcePolicy",
+                    "secretsmanager:GetSecretValue",
+                    "secretsmanager:ListSecretVersionIds"
+                ],
+                effect=iam.Effect.ALLOW,
+                resources=[secret_arn]
+            )
+        )
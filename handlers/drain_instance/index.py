@@ -0,0 +1,97 @@
+import json
+import os
+import time
+import traceback
+from datetime import datetime
+from typing import Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+TERMINATING = "autoscaling:EC2_INSTANCE_TERMINATING"
+
+
+class AwsApi:
+    """The ECS and Auto Scaling calls of the drain, on boto3 clients: finding the container
+    instance of an EC2 instance, setting it to DRAINING and completing the lifecycle action
+    with CONTINUE."""
+
+    def __init__(self, ecs, autoscaling):
+        self.ecs = ecs
+        self.autoscaling = autoscaling
+
+    def get_container_instance(self, cluster: str, ec2_instance_id: str) -> Optional[dict]:
+        # every status but INACTIVE, i.e. ACTIVE and DRAINING
+        arns = self.ecs.list_container_instances(cluster=cluster,
+                                                 filter=f"ec2InstanceId == {ec2_instance_id}")["containerInstanceArns"]
+        if not arns:
+            return None
+        return self.ecs.describe_container_instances(cluster=cluster,
+                                                     containerInstances=arns[:1])["containerInstances"][0]
+
+    def set_draining(self, cluster: str, container_instance_arn: str) -> None:
+        self.ecs.update_container_instances_state(cluster=cluster,
+                                                  containerInstances=[container_instance_arn],
+                                                  status="DRAINING")
+
+    def complete_lifecycle_action(self, detail: dict) -> None:
+        try:
+            self.autoscaling.complete_lifecycle_action(LifecycleHookName=detail["LifecycleHookName"],
+                                                       AutoScalingGroupName=detail["AutoScalingGroupName"],
+                                                       LifecycleActionToken=detail["LifecycleActionToken"],
+                                                       InstanceId=detail["EC2InstanceId"],
+                                                       LifecycleActionResult="CONTINUE")
+        except ClientError as e:
+            # the action timed out or was completed already, the instance is on its way out
+            if e.response["Error"]["Code"] != "ValidationError":
+                raise
+
+
+def drain_step(api, cluster: str, detail: dict, deadline: float, now: float) -> bool:
+    """Moves the drain of one instance forward, True once its lifecycle action is completed.
+
+    The container instance is set to DRAINING, so ECS stops placing tasks on it and starts
+    replacements elsewhere. The action is completed when no task is left on the instance,
+    when it never registered with the cluster (e.g. a warm pool instance), or at the deadline.
+    """
+    instance = api.get_container_instance(cluster, detail["EC2InstanceId"])
+    if instance is not None and instance["status"] != "DRAINING":
+        api.set_draining(cluster, instance["containerInstanceArn"])
+
+    drained = instance is None or instance["runningTasksCount"] + instance["pendingTasksCount"] == 0
+    if not drained and now < deadline:
+        return False
+    api.complete_lifecycle_action(detail)
+    return True
+
+
+def deadline_of(message: dict) -> float:
+    # the drain timeout counts from the lifecycle event, not from the first check
+    started = datetime.fromisoformat(message["Time"].replace("Z", "+00:00"))
+    return started.timestamp() + int(message["DrainTimeoutSeconds"])
+
+
+def handle_message(api, message: dict, now: float) -> bool:
+    """True when the message is done with, False when the drain has to be checked again."""
+    detail = message["Detail"]
+    if detail.get("LifecycleTransition") != TERMINATING:
+        return True
+    return drain_step(api, message["Cluster"], detail, deadline_of(message), now)
+
+
+def on_event(event, context):
+    # messages come from the EventBridge rule of each cluster and are sent back to the queue
+    # with a delay until the drain is done
+    api = AwsApi(boto3.client("ecs"), boto3.client("autoscaling"))
+    sqs = boto3.client("sqs")
+    failures = []
+    for record in event["Records"]:
+        try:
+            if not handle_message(api, json.loads(record["body"]), time.time()):
+                sqs.send_message(QueueUrl=os.environ["QUEUE_URL"],
+                                 MessageBody=record["body"],
+                                 DelaySeconds=int(os.environ["POLL_SECONDS"]))
+        except Exception:
+            traceback.print_exc()
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
@@ -0,0 +1,88 @@
+import hashlib
+import json
+from typing import Tuple
+
+import boto3
+
+DOCKER_MANIFEST = "application/vnd.docker.distribution.manifest.v2+json"
+DOCKER_MANIFEST_LIST = "application/vnd.docker.distribution.manifest.list.v2+json"
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+OCI_INDEX = "application/vnd.oci.image.index.v1+json"
+
+MANIFEST_MEDIA_TYPES = [DOCKER_MANIFEST, DOCKER_MANIFEST_LIST, OCI_MANIFEST, OCI_INDEX]
+
+
+def get_image(ecr, repository_name: str, tag: str) -> dict:
+    response = ecr.batch_get_image(repositoryName=repository_name,
+                                   imageIds=[{"imageTag": tag}],
+                                   acceptedMediaTypes=MANIFEST_MEDIA_TYPES)
+    if not response["images"]:
+        raise RuntimeError(f"image {repository_name}:{tag} not found: {response['failures']}")
+    return response["images"][0]
+
+
+def media_type_of(image: dict) -> str:
+    return image.get("imageManifestMediaType") or json.loads(image["imageManifest"]).get("mediaType", DOCKER_MANIFEST)
+
+
+def build_index(images: list) -> Tuple[str, str]:
+    """Build a manifest list from (image, architecture) pairs.
+
+    Returns the serialized manifest and its media type. A docker manifest list is used when
+    every child is a docker manifest, an OCI index otherwise.
+    """
+    manifests = []
+    for image, architecture in images:
+        manifests.append({
+            "mediaType": media_type_of(image),
+            "digest": image["imageId"]["imageDigest"],
+            "size": len(image["imageManifest"].encode("utf-8")),
+            "platform": {"architecture": architecture, "os": "linux"}
+        })
+    media_type = DOCKER_MANIFEST_LIST if all(m["mediaType"] == DOCKER_MANIFEST for m in manifests) else OCI_INDEX
+    index = {"schemaVersion": 2, "mediaType": media_type, "manifests": manifests}
+    # stable serialization keeps the digest unchanged when the children are unchanged
+    return json.dumps(index, sort_keys=True, separators=(",", ":")), media_type
+
+
+def tag_image(ecr, repository_name: str, sources: list, tags: list) -> str:
+    """Point every tag at the image stored under the source tags.
+
+    A single source is retagged as is; several sources (one per architecture) are combined
+    into a multi-architecture manifest list first. PutImage only writes the manifest, so no
+    layers are copied. Returns the digest the tags point at.
+    """
+    images = [(get_image(ecr, repository_name, source["Tag"]), source["Architecture"]) for source in sources]
+    if len(images) == 1:
+        image = images[0][0]
+        manifest, media_type = image["imageManifest"], media_type_of(image)
+        digest = image["imageId"]["imageDigest"]
+    else:
+        manifest, media_type = build_index(images)
+        digest = "sha256:" + hashlib.sha256(manifest.encode("utf-8")).hexdigest()
+
+    for tag in tags:
+        try:
+            ecr.put_image(repositoryName=repository_name,
+                          imageManifest=manifest,
+                          imageManifestMediaType=media_type,
+                          imageTag=tag,
+                          imageDigest=digest)
+        except ecr.exceptions.ImageAlreadyExistsException:
+            # the tag already points at this digest
+            pass
+
+    return digest
+
+
+def on_event(event, context):
+    if event["RequestType"] == "Delete":
+        # tags are left in place and expire through the repository lifecycle rules
+        return {"PhysicalResourceId": event["PhysicalResourceId"]}
+
+    props = event["ResourceProperties"]
+    digest = tag_image(boto3.client("ecr"), props["RepositoryName"], props["Sources"], props["Tags"])
+    return {
+        "PhysicalResourceId": f"{props['RepositoryName']}@{digest}",
+        "Data": {"ImageDigest": digest}
+    }
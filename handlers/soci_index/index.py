@@ -0,0 +1,121 @@
+import json
+
+import boto3
+
+# set by the soci CLI on every zTOC blob of an index, the digest of the image layer it covers
+SOCI_LAYER_ANNOTATION = "com.amazon.soci.image-layer-digest"
+
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+MANIFEST_MEDIA_TYPES = [
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    OCI_MANIFEST,
+    "application/vnd.oci.image.index.v1+json",
+]
+
+
+class EcrRegistry:
+    """Reads manifests by digest from ECR.
+
+    Anything with the same get_manifest method (e.g. a dict backed stand-in) can be used
+    instead, so the summary can be computed without AWS.
+    """
+
+    def __init__(self, ecr):
+        self.ecr = ecr
+
+    def get_manifest(self, repository_name: str, digest: str) -> str:
+        response = self.ecr.batch_get_image(repositoryName=repository_name,
+                                            imageIds=[{"imageDigest": digest}],
+                                            acceptedMediaTypes=MANIFEST_MEDIA_TYPES)
+        if not response["images"]:
+            raise RuntimeError(f"manifest {repository_name}@{digest} not found: {response['failures']}")
+        return response["images"][0]["imageManifest"]
+
+
+def summarize_indexes(registry, repository_name: str, index_digests: list) -> dict:
+    """Total size of the SOCI indexes and the share of image layers they cover.
+
+    Each index manifest references the image manifest it was built for as its subject and
+    has one zTOC blob per indexed layer, annotated with the layer digest.
+    """
+    index_bytes = 0
+    layer_bytes = 0
+    covered_bytes = 0
+    layer_count = 0
+    covered_count = 0
+    for digest in index_digests:
+        raw_index = registry.get_manifest(repository_name, digest)
+        index = json.loads(raw_index)
+        index_bytes += len(raw_index.encode("utf-8")) + sum(blob["size"] for blob in index.get("layers", []))
+        indexed = {blob.get("annotations", {}).get(SOCI_LAYER_ANNOTATION) for blob in index.get("layers", [])}
+
+        image = json.loads(registry.get_manifest(repository_name, index["subject"]["digest"]))
+        for layer in image.get("layers", []):
+            layer_count += 1
+            layer_bytes += layer["size"]
+            if layer["digest"] in indexed:
+                covered_count += 1
+                covered_bytes += layer["size"]
+
+    return {
+        "IndexDigests": ",".join(index_digests),
+        "IndexSizeBytes": str(index_bytes),
+        "IndexedLayers": f"{covered_count}/{layer_count}",
+        "LayerCoverage": f"{covered_bytes / layer_bytes:.2f}" if layer_bytes else "0.00"
+    }
+
+
+def start_index_build(codebuild, props: dict) -> str:
+    response = codebuild.start_build(
+        projectName=props["ProjectName"],
+        environmentVariablesOverride=[
+            {"name": "IMAGE_REF", "value": f"{props['RepositoryUri']}@{props['ImageDigest']}", "type": "PLAINTEXT"},
+            {"name": "PLATFORM_FLAGS", "value": props.get("PlatformFlags", ""), "type": "PLAINTEXT"},
+            {"name": "MIN_LAYER_SIZE", "value": str(props["MinLayerSize"]), "type": "PLAINTEXT"},
+        ])
+    return response["build"]["id"]
+
+
+def check_index_build(codebuild, build_id: str):
+    """Returns the exported index digests once the build succeeded, None while it is running."""
+    build = codebuild.batch_get_builds(ids=[build_id])["builds"][0]
+    status = build["buildStatus"]
+    if status == "IN_PROGRESS":
+        return None
+    if status != "SUCCEEDED":
+        raise RuntimeError(f"SOCI index build {build_id} finished with {status}")
+
+    exported = {v["name"]: v["value"] for v in build.get("exportedEnvironmentVariables", [])}
+    digests = [d for d in exported.get("SOCI_INDEX_DIGESTS", "").split(",") if d]
+    if not digests:
+        raise RuntimeError(f"SOCI index build {build_id} did not report any index")
+    return digests
+
+
+def on_event(event, context):
+    if event["RequestType"] == "Delete":
+        # indexes are referrers of the image and go away with it
+        return {"PhysicalResourceId": event["PhysicalResourceId"]}
+
+    props = event["ResourceProperties"]
+    build_id = start_index_build(boto3.client("codebuild"), props)
+    return {
+        "PhysicalResourceId": f"{props['RepositoryName']}@{props['ImageDigest']}/soci",
+        "Data": {"BuildId": build_id}
+    }
+
+
+def is_complete(event, context):
+    if event["RequestType"] == "Delete":
+        return {"IsComplete": True}
+
+    digests = check_index_build(boto3.client("codebuild"), event["Data"]["BuildId"])
+    if digests is None:
+        return {"IsComplete": False}
+
+    registry = EcrRegistry(boto3.client("ecr"))
+    return {
+        "IsComplete": True,
+        "Data": summarize_indexes(registry, event["ResourceProperties"]["RepositoryName"], digests)
+    }
@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# CPU units ECS registers per vCPU
+CPU_UNITS_PER_VCPU = 1024
+# the kernel keeps part of the nominal memory and ECS registers what is left; the fraction
+# is an estimate, the exact amount depends on the AMI and the instance type. ECS reserves
+# nothing for the agent unless ECS_RESERVED_MEMORY is set.
+KERNEL_MEMORY_OVERHEAD_FRACTION = 0.06
+
+
+@dataclass(frozen=True)
+class InstanceSpec:
+    vcpus: int
+    memory_mib: int
+    # network interfaces incl. the primary one, which awsvpc tasks cannot use
+    max_enis: int
+
+    @property
+    def cpu_units(self) -> int:
+        return self.vcpus * CPU_UNITS_PER_VCPU
+
+    @property
+    def registered_memory_mib(self) -> int:
+        return int(self.memory_mib * (1 - KERNEL_MEMORY_OVERHEAD_FRACTION))
+
+    @property
+    def awsvpc_task_limit(self) -> int:
+        return self.max_enis - 1
+
+
+# offline table, no EC2 API calls at synth time. Sizes of the current general purpose (m),
+# compute (c) and memory (r) families share vCPUs and ENIs and differ in GiB per vCPU.
+_SIZES = {
+    # size: (vcpus, max enis)
+    "medium": (1, 2),
+    "large": (2, 3),
+    "xlarge": (4, 4),
+    "2xlarge": (8, 4),
+    "4xlarge": (16, 8),
+    "8xlarge": (32, 8),
+    "12xlarge": (48, 8),
+    "16xlarge": (64, 15),
+    "24xlarge": (96, 15),
+}
+_FAMILIES = {
+    # family: GiB per vCPU
+    **{f: 4 for f in ("m5", "m5a", "m5d", "m6a", "m6i", "m6g", "m6gd", "m7a", "m7i", "m7g", "m7gd")},
+    **{f: 2 for f in ("c5", "c5a", "c5d", "c6a", "c6i", "c6g", "c6gd", "c7a", "c7i", "c7g", "c7gd")},
+    **{f: 8 for f in ("r5", "r5a", "r5d", "r6a", "r6i", "r6g", "r6gd", "r7a", "r7i", "r7g", "r7gd")},
+}
+# burstable families, (vcpus, memory MiB, max enis)
+_BURSTABLE = {
+    "nano": (2, 512, 2),
+    "micro": (2, 1024, 2),
+    "small": (2, 2048, 3),
+    "medium": (2, 4096, 3),
+    "large": (2, 8192, 3),
+    "xlarge": (4, 16384, 4),
+    "2xlarge": (8, 32768, 4),
+}
+_T2 = {
+    "nano": (1, 512, 2),
+    "micro": (1, 1024, 2),
+    "small": (1, 2048, 3),
+    "medium": (2, 4096, 3),
+    "large": (2, 8192, 3),
+    "xlarge": (4, 16384, 3),
+    "2xlarge": (8, 32768, 3),
+}
+
+
+def _build_table() -> Dict[str, InstanceSpec]:
+    table = dict()
+    for family, gib_per_vcpu in _FAMILIES.items():
+        for size, (vcpus, max_enis) in _SIZES.items():
+            graviton = family.endswith(("g", "gd"))
+            # medium only exists for the Graviton families, which stop at 16xlarge
+            if size == "medium" and not graviton or size == "24xlarge" and graviton:
+                continue
+            # c5 and c5d have 9xlarge and 18xlarge (below) instead of 8xlarge and 16xlarge
+            if family in ("c5", "c5d") and size in ("8xlarge", "16xlarge"):
+                continue
+            table[f"{family}.{size}"] = InstanceSpec(vcpus, vcpus * gib_per_vcpu * 1024, max_enis)
+    for family in ("t3", "t3a", "t4g"):
+        for size, spec in _BURSTABLE.items():
+            table[f"{family}.{size}"] = InstanceSpec(*spec)
+    for size, spec in _T2.items():
+        table[f"t2.{size}"] = InstanceSpec(*spec)
+    # compute optimized sizes outside the common scheme
+    for family in ("c5", "c5d"):
+        table.update({
+            f"{family}.9xlarge": InstanceSpec(36, 73728, 8),
+            f"{family}.18xlarge": InstanceSpec(72, 147456, 15),
+        })
+    return table
+
+
+INSTANCE_SPECS = _build_table()
+
+
+def instance_spec(instance_type: str) -> Optional[InstanceSpec]:
+    return INSTANCE_SPECS.get(instance_type)
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple, Union
+
+import aws_cdk as cdk
+from aws_cdk import (
+    aws_ec2 as ec2,
+    aws_ecs as ecs,
+    aws_elasticloadbalancingv2 as elbv2
+)
+from constructs import Construct
+
+
+@dataclass
+class LoadBalancerOptions:
+    # network load balancer instead of an application load balancer
+    network: bool = False
+    internet_facing: bool = False
+    subnets: Optional[ec2.SubnetSelection] = None
+    listener_port: int = 80
+    # HTTPS listener certificates (ALB only)
+    certificate_arns: Optional[Sequence[str]] = None
+    # container port to route to, defaults to the first port of the service
+    container_port: Optional[int] = None
+    # health checks: short intervals and low thresholds detect new and failing tasks quickly
+    health_check_path: str = "/"
+    health_check_healthy_http_codes: str = "200-399"
+    health_check_interval_seconds: int = 10
+    health_check_timeout_seconds: int = 5
+    healthy_threshold_count: int = 2
+    unhealthy_threshold_count: int = 3
+    # time in-flight requests get to finish before a task is deregistered
+    deregistration_delay_seconds: int = 30
+    # ALB only: ramp traffic to new tasks over this period instead of sending a full share
+    slow_start_seconds: Optional[int] = None
+    # ALB only: route to the target with the fewest in-flight requests instead of round robin
+    least_outstanding_requests: bool = False
+
+
+def attach_load_balancer(scope: Construct,
+                         vpc: ec2.IVpc,
+                         service: ecs.BaseService,
+                         container_name: str,
+                         container_port: int,
+                         options: LoadBalancerOptions,
+                         targets_connectable: Optional[ec2.IConnectable] = None,
+                         target_port_range: Optional[ec2.Port] = None
+                         ) -> Tuple[elbv2.BaseLoadBalancer,
+                                    Union[elbv2.ApplicationListener, elbv2.NetworkListener],
+                                    Union[elbv2.ApplicationTargetGroup, elbv2.NetworkTargetGroup]]:
+    if options.network and (options.slow_start_seconds or options.least_outstanding_requests or options.certificate_arns):
+        raise ValueError("slow start, least outstanding requests and certificates are ALB only options")
+
+    client_peer = ec2.Peer.any_ipv4() if options.internet_facing else ec2.Peer.ipv4(vpc.vpc_cidr_block)
+    target = service.load_balancer_target(container_name=container_name, container_port=container_port)
+    deregistration_delay = cdk.Duration.seconds(options.deregistration_delay_seconds)
+    # awsvpc tasks are reached through the service security group; bridge and host mode tasks
+    # through the container instances, on the host port or the dynamic host port range
+    targets_connectable = targets_connectable or service
+    target_port_range = target_port_range or ec2.Port.tcp(container_port)
+
+    if options.network:
+        security_group = ec2.SecurityGroup(scope, "LoadBalancerSG", vpc=vpc, allow_all_outbound=True)
+        load_balancer = elbv2.NetworkLoadBalancer(scope, "LoadBalancer",
+                                                  vpc=vpc,
+                                                  internet_facing=options.internet_facing,
+                                                  vpc_subnets=options.subnets,
+                                                  security_groups=[security_group])
+        load_balancer.connections.allow_from(client_peer, ec2.Port.tcp(options.listener_port))
+        load_balancer.connections.allow_to(targets_connectable, target_port_range)
+
+        listener = load_balancer.add_listener("Listener", port=options.listener_port)
+        target_group = listener.add_targets("Targets",
+                                            port=container_port,
+                                            targets=[target],
+                                            deregistration_delay=deregistration_delay,
+                                            health_check=elbv2.HealthCheck(
+                                                interval=cdk.Duration.seconds(options.health_check_interval_seconds),
+                                                timeout=cdk.Duration.seconds(options.health_check_timeout_seconds),
+                                                healthy_threshold_count=options.healthy_threshold_count,
+                                                unhealthy_threshold_count=options.unhealthy_threshold_count
+                                            ))
+        return load_balancer, listener, target_group
+
+    load_balancer = elbv2.ApplicationLoadBalancer(scope, "LoadBalancer",
+                                                  vpc=vpc,
+                                                  internet_facing=options.internet_facing,
+                                                  vpc_subnets=options.subnets)
+    listener = load_balancer.add_listener("Listener",
+                                          port=options.listener_port,
+                                          certificates=[elbv2.ListenerCertificate.from_arn(arn)
+                                                        for arn in options.certificate_arns or []] or None,
+                                          open=False)
+    listener.connections.allow_default_port_from(client_peer)
+    load_balancer.connections.allow_to(targets_connectable, target_port_range)
+
+    target_group = listener.add_targets("Targets",
+                                        port=container_port,
+                                        protocol=elbv2.ApplicationProtocol.HTTP,
+                                        targets=[target],
+                                        deregistration_delay=deregistration_delay,
+                                        slow_start=cdk.Duration.seconds(options.slow_start_seconds)
+                                        if options.slow_start_seconds else None,
+                                        load_balancing_algorithm_type=elbv2.TargetGroupLoadBalancingAlgorithmType.LEAST_OUTSTANDING_REQUESTS
+                                        if options.least_outstanding_requests else None,
+                                        health_check=elbv2.HealthCheck(
+                                            path=options.health_check_path,
+                                            healthy_http_codes=options.health_check_healthy_http_codes,
+                                            interval=cdk.Duration.seconds(options.health_check_interval_seconds),
+                                            timeout=cdk.Duration.seconds(options.health_check_timeout_seconds),
+                                            healthy_threshold_count=options.healthy_threshold_count,
+                                            unhealthy_threshold_count=options.unhealthy_threshold_count
+                                        ))
+    return load_balancer, listener, target_group
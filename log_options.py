@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import Mapping, Optional
+
+import aws_cdk as cdk
+from aws_cdk import (
+    aws_iam as iam,
+    aws_logs as logs,
+    aws_ecs as ecs
+)
+
+FIRELENS_ROUTER_MEMORY_MIB = 50
+FLUENT_BIT_IMAGE = "public.ecr.aws/aws-observability/aws-for-fluent-bit:stable"
+
+
+@dataclass
+class LogOptions:
+    # awslogs delivery mode: non-blocking buffers log lines in memory instead of blocking
+    # stdout writes when CloudWatch is slow or throttling; lines are dropped once the
+    # buffer is full
+    non_blocking: bool = False
+    max_buffer_size_mib: Optional[int] = None
+    # route logs through a Fluent Bit sidecar instead of the awslogs driver
+    firelens: bool = False
+    # number of events the docker firelens driver batches in memory before the router
+    firelens_buffer_limit: Optional[int] = None
+    # Fluent Bit output plugin options, merged over the default cloudwatch_logs output, e.g.
+    # {"Name": "kinesis_firehose", "delivery_stream": "...", "compression": "gzip"}
+    firelens_output_options: Optional[Mapping[str, str]] = None
+
+
+def build_log_driver(task_definition: ecs.TaskDefinition,
+                     log_group: logs.ILogGroup,
+                     service_id: str,
+                     options: Optional[LogOptions] = None,
+                     stream_prefix: str = "ecs") -> ecs.LogDriver:
+    options = options or LogOptions()
+
+    if options.max_buffer_size_mib and not options.non_blocking:
+        raise ValueError("max_buffer_size_mib only applies to the non-blocking mode")
+
+    def aws_logs(prefix: str) -> ecs.LogDriver:
+        return ecs.LogDrivers.aws_logs(
+            log_group=log_group,
+            stream_prefix=prefix,
+            mode=ecs.AwsLogDriverMode.NON_BLOCKING if options.non_blocking else None,
+            max_buffer_size=cdk.Size.mebibytes(options.max_buffer_size_mib) if options.max_buffer_size_mib else None
+        )
+
+    if not options.firelens:
+        return aws_logs(stream_prefix)
+
+    router_logging = aws_logs("firelens")
+    task_definition.add_firelens_log_router("LogRouter",
+                                            image=ecs.ContainerImage.from_registry(FLUENT_BIT_IMAGE),
+                                            firelens_config=ecs.FirelensConfig(
+                                                type=ecs.FirelensLogRouterType.FLUENTBIT,
+                                                options=ecs.FirelensOptions(enable_ecs_log_metadata=True)
+                                            ),
+                                            memory_reservation_mib=FIRELENS_ROUTER_MEMORY_MIB,
+                                            essential=True,
+                                            logging=router_logging)
+
+    output_options = {"Name": "cloudwatch_logs", "region": cdk.Stack.of(task_definition).region}
+    output_options.update(options.firelens_output_options or {})
+    if output_options["Name"] == "cloudwatch_logs":
+        output_options = {
+            "log_group_name": log_group.log_group_name,
+            "log_stream_prefix": f"ecs/{service_id}/",
+            "auto_create_group": "false",
+            **output_options
+        }
+        # Fluent Bit ships with the task role, scoped to the same ecs/{id}* streams
+        task_definition.task_role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "logs:CreateLogStream",
+                    "logs:DescribeLogStreams",
+                    "logs:PutLogEvents"
+                ],
+                effect=iam.Effect.ALLOW,
+                resources=[
+                    log_group.log_group_arn,
+                    f"{log_group.log_group_arn}:log-stream:ecs/{service_id}*"
+                ]
+            )
+        )
+
+    if options.firelens_buffer_limit:
+        output_options["log-driver-buffer-limit"] = str(options.firelens_buffer_limit)
+
+    return ecs.LogDrivers.firelens(options=output_options)
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import Mapping, Optional, Tuple
+
+import aws_cdk as cdk
+from aws_cdk import (
+    aws_cloudwatch as cloudwatch,
+    aws_ecs as ecs,
+    aws_logs as logs,
+    aws_servicediscovery as servicediscovery
+)
+
+
+@dataclass
+class ServiceDiscoveryOptions:
+    # Cloud Map namespace, created as the cluster's default (private DNS) namespace if the
+    # cluster has none yet
+    namespace_name: str
+    # Service Connect routes calls through a proxy sidecar; without it the tasks are only
+    # registered as Cloud Map DNS records
+    service_connect: bool = True
+    # name the service is registered under, defaults to the hyphenated construct id
+    discovery_name: Optional[str] = None
+    # Service Connect: client alias per container port, e.g. {8080: "orders.internal"}
+    aliases: Optional[Mapping[int, str]] = None
+    idle_timeout_seconds: Optional[int] = None
+    per_request_timeout_seconds: Optional[int] = None
+    # Service Connect: only call other services, publish no endpoint of our own
+    client_only: bool = False
+    dns_ttl_seconds: int = 10
+
+
+def configure_service_discovery(cluster: ecs.Cluster,
+                                log_group: logs.ILogGroup,
+                                container: ecs.ContainerDefinition,
+                                discovery_name: str,
+                                port_mapping_names: Mapping[int, str],
+                                network_mode: ecs.NetworkMode,
+                                options: ServiceDiscoveryOptions
+                                ) -> Tuple[Optional[ecs.CloudMapOptions], Optional[ecs.ServiceConnectProps]]:
+    """Returns the cloud_map_options and service_connect_configuration for the service."""
+    if options.aliases and set(options.aliases) - set(port_mapping_names):
+        raise ValueError("aliases must map ports of the service")
+
+    namespace = cluster.default_cloud_map_namespace
+    if namespace is None:
+        namespace = cluster.add_default_cloud_map_namespace(name=options.namespace_name,
+                                                            type=servicediscovery.NamespaceType.DNS_PRIVATE,
+                                                            use_for_service_connect=True)
+    elif namespace.namespace_name != options.namespace_name:
+        raise ValueError(f"cluster already uses the {namespace.namespace_name} namespace")
+
+    if not options.service_connect:
+        if not port_mapping_names:
+            raise ValueError("Cloud Map registration requires a service port")
+        # bridge and host mode tasks share the instance address, so the port has to be
+        # published through an SRV record
+        port = next(iter(port_mapping_names))
+        is_awsvpc = network_mode == ecs.NetworkMode.AWS_VPC
+        return ecs.CloudMapOptions(name=discovery_name,
+                                   cloud_map_namespace=namespace,
+                                   dns_record_type=servicediscovery.DnsRecordType.A
+                                   if is_awsvpc else servicediscovery.DnsRecordType.SRV,
+                                   dns_ttl=cdk.Duration.seconds(options.dns_ttl_seconds),
+                                   container=None if is_awsvpc else container,
+                                   container_port=None if is_awsvpc else port), None
+
+    services = None
+    if not options.client_only:
+        if not port_mapping_names:
+            raise ValueError("Service Connect endpoints require a service port, use client_only instead")
+        aliases = options.aliases or {}
+        services = [
+            ecs.ServiceConnectService(
+                port_mapping_name=name,
+                discovery_name=discovery_name if len(port_mapping_names) == 1 else f"{discovery_name}-{port}",
+                dns_name=aliases.get(port),
+                port=port,
+                idle_timeout=cdk.Duration.seconds(options.idle_timeout_seconds)
+                if options.idle_timeout_seconds is not None else None,
+                per_request_timeout=cdk.Duration.seconds(options.per_request_timeout_seconds)
+                if options.per_request_timeout_seconds is not None else None
+            )
+            for port, name in port_mapping_names.items()
+        ]
+
+    # the proxy logs next to the application container
+    return None, ecs.ServiceConnectProps(namespace=namespace.namespace_arn,
+                                         services=services,
+                                         log_driver=ecs.LogDrivers.aws_logs(log_group=log_group,
+                                                                            stream_prefix="service-connect"))
+
+
+def service_connect_metric(cluster: ecs.ICluster,
+                           discovery_name: str,
+                           metric_name: str = "TargetResponseTime",
+                           target_discovery_name: Optional[str] = None,
+                           service_name: Optional[str] = None,
+                           statistic: str = "p99",
+                           period: cdk.Duration = cdk.Duration.minutes(1)) -> cloudwatch.Metric:
+    """Metric published by the Service Connect proxies.
+
+    Without target_discovery_name it covers the traffic the service receives; with it, the
+    calls from discovery_name to that service, i.e. the latency of a single route.
+    """
+    dimensions = {"ClusterName": cluster.cluster_name, "DiscoveryName": discovery_name}
+    if service_name:
+        dimensions["ServiceName"] = service_name
+    if target_discovery_name:
+        dimensions["TargetDiscoveryName"] = target_discovery_name
+    return cloudwatch.Metric(namespace="AWS/ECS",
+                             metric_name=metric_name,
+                             dimensions_map=dimensions,
+                             statistic=statistic,
+                             period=period)
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Mapping, Optional
+
+import aws_cdk as cdk
+from aws_cdk import (
+    aws_ec2 as ec2,
+    aws_ecs as ecs,
+    aws_efs as efs
+)
+from constructs import Construct
+
+# Fargate's ephemeral storage range; 20 GiB is the default when unset
+MIN_EPHEMERAL_STORAGE_GIB = 21
+MAX_EPHEMERAL_STORAGE_GIB = 200
+
+
+@dataclass
+class EfsVolumeOptions:
+    container_path: str
+    # existing file system, a new encrypted one is created when None
+    file_system: Optional[efs.IFileSystem] = None
+    # new file systems only: elastic throughput scales with the workload and is billed per
+    # GiB transferred, provisioned throughput is a fixed rate independent of the data size
+    throughput_mode: efs.ThroughputMode = efs.ThroughputMode.ELASTIC
+    provisioned_throughput_mibps: Optional[int] = None
+    # access point the tasks enter the file system through, with its own root and POSIX user
+    access_point_path: Optional[str] = None
+    posix_uid: str = "1000"
+    posix_gid: str = "1000"
+    read_only: bool = False
+    # TLS to the mount target; IAM authorization requires it
+    transit_encryption: bool = True
+    iam_authorization: bool = True
+
+
+@dataclass
+class BindMount:
+    container_path: str
+    # host path; without it docker creates a directory that lives as long as the task
+    source_path: Optional[str] = None
+    read_only: bool = False
+
+
+def add_efs_volumes(scope: Construct,
+                    vpc: ec2.IVpc,
+                    task_definition: ecs.TaskDefinition,
+                    container: ecs.ContainerDefinition,
+                    connectable: ec2.IConnectable,
+                    volumes: Mapping[str, EfsVolumeOptions]) -> Mapping[str, efs.IFileSystem]:
+    file_systems = dict()
+    for name, options in volumes.items():
+        if options.iam_authorization and not options.transit_encryption:
+            raise ValueError("EFS IAM authorization requires transit encryption")
+        if (options.provisioned_throughput_mibps is not None) != \
+                (options.throughput_mode == efs.ThroughputMode.PROVISIONED):
+            raise ValueError("provisioned_throughput_mibps goes with the PROVISIONED throughput mode")
+
+        file_system = options.file_system
+        if file_system is None:
+            file_system = efs.FileSystem(scope, f"{name}FileSystem",
+                                         vpc=vpc,
+                                         encrypted=True,
+                                         throughput_mode=options.throughput_mode,
+                                         provisioned_throughput_per_second=cdk.Size.mebibytes(
+                                             options.provisioned_throughput_mibps)
+                                         if options.provisioned_throughput_mibps is not None else None)
+        file_system.connections.allow_default_port_from(connectable)
+
+        access_point = None
+        if options.access_point_path:
+            access_point = efs.AccessPoint(scope, f"{name}AccessPoint",
+                                           file_system=file_system,
+                                           path=options.access_point_path,
+                                           create_acl=efs.Acl(owner_uid=options.posix_uid,
+                                                              owner_gid=options.posix_gid,
+                                                              permissions="750"),
+                                           posix_user=efs.PosixUser(uid=options.posix_uid,
+                                                                    gid=options.posix_gid))
+
+        if options.iam_authorization:
+            actions = ["elasticfilesystem:ClientMount"]
+            if not options.read_only:
+                actions.append("elasticfilesystem:ClientWrite")
+            file_system.grant(task_definition.task_role, *actions)
+
+        task_definition.add_volume(name=name,
+                                   efs_volume_configuration=ecs.EfsVolumeConfiguration(
+                                       file_system_id=file_system.file_system_id,
+                                       transit_encryption="ENABLED" if options.transit_encryption else "DISABLED",
+                                       authorization_config=ecs.AuthorizationConfig(
+                                           access_point_id=access_point.access_point_id if access_point else None,
+                                           iam="ENABLED" if options.iam_authorization else "DISABLED")
+                                   ))
+        container.add_mount_points(ecs.MountPoint(container_path=options.container_path,
+                                                  source_volume=name,
+                                                  read_only=options.read_only))
+        file_systems[name] = file_system
+    return file_systems
+
+
+def add_bind_mounts(task_definition: ecs.TaskDefinition,
+                    container: ecs.ContainerDefinition,
+                    mounts: Mapping[str, BindMount]) -> None:
+    for name, mount in mounts.items():
+        task_definition.add_volume(name=name,
+                                   host=ecs.Host(source_path=mount.source_path) if mount.source_path else None)
+        container.add_mount_points(ecs.MountPoint(container_path=mount.container_path,
+                                                  source_volume=name,
+                                                  read_only=mount.read_only))
@@ -0,0 +1,45 @@
+import importlib
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+LIBRARY_PATH = Path(__file__).resolve().parent.parent
+LIBRARY_NAME = "cdk_custom_constructs"
+
+
+@pytest.fixture(scope="session")
+def library():
+    """The constructs as a package; the repository is not installed, so it is loaded by path."""
+    if LIBRARY_NAME not in sys.modules:
+        spec = importlib.util.spec_from_file_location(LIBRARY_NAME, LIBRARY_PATH / "__init__.py",
+                                                      submodule_search_locations=[str(LIBRARY_PATH)])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[LIBRARY_NAME] = module
+        spec.loader.exec_module(module)
+    return lambda name: importlib.import_module(f"{LIBRARY_NAME}.{name}")
+
+
+@pytest.fixture(scope="session")
+def load_handler():
+    """Loads handlers/<name>/index.py by path; the handlers are not packages and share the module name."""
+    def load(name: str):
+        spec = importlib.util.spec_from_file_location(name, LIBRARY_PATH / "handlers" / name / "index.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    return load
+
+
+@pytest.fixture
+def stack():
+    import aws_cdk as cdk
+    app = cdk.App()
+    return cdk.Stack(app, "Test", env=cdk.Environment(account="111111111111", region="us-east-1"))
+
+
+@pytest.fixture
+def vpc(stack):
+    from aws_cdk import aws_ec2 as ec2
+    return ec2.Vpc(stack, "Vpc")
@@ -0,0 +1,58 @@
+import pytest
+from aws_cdk import assertions
+from constructs import Construct
+
+
+@pytest.fixture
+def capacity_planner(library):
+    return library("capacity_planner")
+
+
+def messages(stack, severity):
+    annotations = assertions.Annotations.from_stack(stack)
+    find = annotations.find_error if severity == "error" else annotations.find_warning
+    return [m.entry.data for m in find("*", assertions.Match.string_like_regexp("capacity planner"))]
+
+
+def plan(capacity_planner, stack, memory_mib, desired_count=1, max_capacity=1):
+    service = capacity_planner.PlannedService(name="web", cpu=1024, memory_mib=memory_mib,
+                                              desired_count=desired_count, max_count=desired_count)
+    capacity_planner.CapacityPlanner(Construct(stack, "Cluster"), [service], ["m5.large"],
+                                     desired_capacity=1, max_capacity=max_capacity).plan()
+
+
+def test_registered_memory_has_no_agent_reservation(library):
+    spec = library("instance_specs").instance_spec("m5.large")
+    assert spec.registered_memory_mib == int(8192 * 0.94)
+
+
+def test_task_within_the_estimated_registered_memory(capacity_planner, stack):
+    plan(capacity_planner, stack, 7500)
+    assert messages(stack, "error") == []
+    assert messages(stack, "warning") == []
+
+
+def test_task_within_the_overhead_margin_is_a_warning(capacity_planner, stack):
+    plan(capacity_planner, stack, 7900)
+    assert messages(stack, "error") == []
+    assert any("may fit" in m for m in messages(stack, "warning"))
+
+
+def test_task_above_the_nominal_memory_is_an_error(capacity_planner, stack):
+    plan(capacity_planner, stack, 8300)
+    assert any("does not fit on m5.large" in m for m in messages(stack, "error"))
+
+
+def test_tasks_beyond_max_capacity_are_an_error(capacity_planner, stack):
+    plan(capacity_planner, stack, 3000, desired_count=3)
+    assert any("1 desired tasks cannot be placed" in m for m in messages(stack, "error"))
+
+
+def test_pack_is_first_fit_decreasing(capacity_planner, library):
+    spec = library("instance_specs").instance_spec("m5.large")
+    services = [capacity_planner.PlannedService(name="small", cpu=256, memory_mib=1024, desired_count=4, max_count=4),
+                capacity_planner.PlannedService(name="large", cpu=1024, memory_mib=6000, desired_count=1, max_count=1)]
+    placement = capacity_planner.pack(services, spec, 2)
+    assert placement.unplaceable == {}
+    assert placement.instances_used == 2
+    assert placement.memory_reserved == 10096
@@ -0,0 +1,134 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+import pytest
+from botocore.exceptions import ClientError
+
+TERMINATING = "autoscaling:EC2_INSTANCE_TERMINATING"
+EVENT_TIME = "2026-10-18T10:00:00Z"
+STARTED = datetime(2026, 10, 18, 10, tzinfo=timezone.utc).timestamp()
+DRAIN_TIMEOUT_SECONDS = 600
+
+
+class LocalCluster:
+    """In-memory stand-in for AwsApi: container instances by EC2 instance id, and the
+    instances whose lifecycle action was completed."""
+
+    def __init__(self):
+        self.container_instances = dict()
+        self.completed_actions = list()
+
+    def register(self, ec2_instance_id: str, running_tasks: int = 0, pending_tasks: int = 0) -> dict:
+        instance = {
+            "containerInstanceArn": f"arn:aws:ecs:local:000000000000:container-instance/local/{ec2_instance_id}",
+            "ec2InstanceId": ec2_instance_id,
+            "status": "ACTIVE",
+            "runningTasksCount": running_tasks,
+            "pendingTasksCount": pending_tasks
+        }
+        self.container_instances[ec2_instance_id] = instance
+        return instance
+
+    def get_container_instance(self, cluster: str, ec2_instance_id: str) -> Optional[dict]:
+        instance = self.container_instances.get(ec2_instance_id)
+        return dict(instance) if instance else None
+
+    def set_draining(self, cluster: str, container_instance_arn: str) -> None:
+        for instance in self.container_instances.values():
+            if instance["containerInstanceArn"] == container_instance_arn:
+                instance["status"] = "DRAINING"
+
+    def complete_lifecycle_action(self, detail: dict) -> None:
+        self.completed_actions.append(detail["EC2InstanceId"])
+
+
+@pytest.fixture(scope="module")
+def drain_instance(load_handler):
+    return load_handler("drain_instance")
+
+
+def message(ec2_instance_id="i-0123456789abcdef0", transition=TERMINATING):
+    return {
+        "Cluster": "cluster",
+        "DrainTimeoutSeconds": DRAIN_TIMEOUT_SECONDS,
+        "Time": EVENT_TIME,
+        "Detail": {
+            "LifecycleActionToken": "87654321-4321-4321-4321-210987654321",
+            "AutoScalingGroupName": "asg",
+            "LifecycleHookName": "DrainingHook",
+            "EC2InstanceId": ec2_instance_id,
+            "LifecycleTransition": transition
+        }
+    }
+
+
+def test_running_tasks_keep_the_instance_draining(drain_instance):
+    cluster = LocalCluster()
+    cluster.register("i-0123456789abcdef0", running_tasks=3)
+
+    assert not drain_instance.handle_message(cluster, message(), STARTED + 30)
+    assert cluster.container_instances["i-0123456789abcdef0"]["status"] == "DRAINING"
+    assert cluster.completed_actions == []
+
+
+def test_pending_tasks_count_as_not_drained(drain_instance):
+    cluster = LocalCluster()
+    cluster.register("i-0123456789abcdef0", pending_tasks=1)
+
+    assert not drain_instance.handle_message(cluster, message(), STARTED + 30)
+    assert cluster.completed_actions == []
+
+
+def test_drained_instance_completes_the_action(drain_instance):
+    cluster = LocalCluster()
+    instance = cluster.register("i-0123456789abcdef0", running_tasks=2)
+    assert not drain_instance.handle_message(cluster, message(), STARTED + 30)
+
+    instance["runningTasksCount"] = 0
+    assert drain_instance.handle_message(cluster, message(), STARTED + 60)
+    assert cluster.completed_actions == ["i-0123456789abcdef0"]
+
+
+def test_deadline_completes_the_action_with_tasks_left(drain_instance):
+    cluster = LocalCluster()
+    cluster.register("i-0123456789abcdef0", running_tasks=2)
+
+    assert not drain_instance.handle_message(cluster, message(), STARTED + DRAIN_TIMEOUT_SECONDS - 1)
+    assert drain_instance.handle_message(cluster, message(), STARTED + DRAIN_TIMEOUT_SECONDS)
+    assert cluster.completed_actions == ["i-0123456789abcdef0"]
+
+
+def test_unregistered_warm_pool_instance_completes_at_once(drain_instance):
+    cluster = LocalCluster()
+
+    assert drain_instance.handle_message(cluster, message(), STARTED)
+    assert cluster.completed_actions == ["i-0123456789abcdef0"]
+
+
+def test_other_transitions_are_ignored(drain_instance):
+    cluster = LocalCluster()
+    cluster.register("i-0123456789abcdef0", running_tasks=2)
+
+    assert drain_instance.handle_message(cluster, message(transition="autoscaling:EC2_INSTANCE_LAUNCHING"), STARTED)
+    assert cluster.container_instances["i-0123456789abcdef0"]["status"] == "ACTIVE"
+    assert cluster.completed_actions == []
+
+
+class FakeAutoScaling:
+    def __init__(self, error_code=None):
+        self.error_code = error_code
+
+    def complete_lifecycle_action(self, **kwargs):
+        raise ClientError({"Error": {"Code": self.error_code, "Message": "no active lifecycle action"}},
+                          "CompleteLifecycleAction")
+
+
+def test_completing_an_expired_action_is_ignored(drain_instance):
+    api = drain_instance.AwsApi(None, FakeAutoScaling("ValidationError"))
+    api.complete_lifecycle_action(message()["Detail"])
+
+
+def test_other_errors_of_the_lifecycle_action_are_raised(drain_instance):
+    api = drain_instance.AwsApi(None, FakeAutoScaling("Throttling"))
+    with pytest.raises(ClientError):
+        api.complete_lifecycle_action(message()["Detail"])
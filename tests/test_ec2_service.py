@@ -0,0 +1,91 @@
+import pytest
+from aws_cdk import assertions
+from aws_cdk import aws_autoscaling as autoscaling
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_ecs as ecs
+
+PUBLIC_KEY = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIBenchmarkKeyMaterialOnly test"
+
+
+@pytest.fixture
+def ec2_service(library):
+    return library("ec2_service")
+
+
+def cluster(ec2_service, stack, vpc, id="Cluster", **kwargs):
+    kwargs = {"instance_type": "m5.large", **kwargs}
+    return ec2_service.EC2Cluster(stack, id, vpc=vpc,
+                                  subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+                                  public_key=PUBLIC_KEY, env_dict={},
+                                  max_capacity=2, desired_capacity=1, **kwargs)
+
+
+def test_warm_pool_rejects_all_on_demand_mixed_instances(ec2_service, stack, vpc):
+    with pytest.raises(ValueError, match="mixed instances policy"):
+        cluster(ec2_service, stack, vpc, instance_types=["m5.large", "m5.xlarge"],
+                on_demand_percentage_above_base_capacity=100, enable_warm_pool=True)
+
+
+def test_warm_pool_rejects_spot(ec2_service, stack, vpc):
+    with pytest.raises(ValueError, match="mixed instances policy"):
+        cluster(ec2_service, stack, vpc, instance_types=["m5.large", "m5.xlarge"],
+                on_demand_percentage_above_base_capacity=0, enable_warm_pool=True)
+
+
+def test_warm_pool_with_a_single_instance_type(ec2_service, stack, vpc):
+    cluster(ec2_service, stack, vpc, enable_warm_pool=True, warm_pool_state=autoscaling.PoolState.STOPPED)
+
+
+def service(ec2_service, stack, vpc, ec2_cluster, **kwargs):
+    return ec2_service.EC2Service(stack, "Service", vpc=vpc,
+                                  subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+                                  ec2_cluster=ec2_cluster, container_image=ecs.ContainerImage.from_registry("nginx"),
+                                  container_name="web", **kwargs)
+
+
+def ecs_service_properties(stack):
+    services = assertions.Template.from_stack(stack).find_resources("AWS::ECS::Service")
+    assert len(services) == 1
+    return next(iter(services.values()))["Properties"]
+
+
+def test_service_leaves_desired_count_unset_by_default(ec2_service, stack, vpc):
+    service(ec2_service, stack, vpc, cluster(ec2_service, stack, vpc))
+    assert "DesiredCount" not in ecs_service_properties(stack)
+
+
+def test_service_desired_count(ec2_service, stack, vpc):
+    service(ec2_service, stack, vpc, cluster(ec2_service, stack, vpc), desired_count=3)
+    assert ecs_service_properties(stack)["DesiredCount"] == 3
+
+
+def root_volume_size(stack):
+    templates = assertions.Template.from_stack(stack).find_resources("AWS::EC2::LaunchTemplate")
+    (template,) = templates.values()
+    (root,) = template["Properties"]["LaunchTemplateData"]["BlockDeviceMappings"]
+    return root["Ebs"]["VolumeSize"]
+
+
+def hibernating_cluster(ec2_service, stack, vpc, **kwargs):
+    return cluster(ec2_service, stack, vpc, enable_warm_pool=True,
+                   warm_pool_state=autoscaling.PoolState.HIBERNATED, **kwargs)
+
+
+def test_hibernation_root_volume_is_sized_from_the_ram(ec2_service, stack, vpc):
+    hibernating_cluster(ec2_service, stack, vpc, instance_type="m5.xlarge")
+    assert root_volume_size(stack) == 16 + 30
+
+
+def test_hibernation_root_volume_needs_room_beyond_the_ram(ec2_service, stack, vpc):
+    with pytest.raises(ValueError, match="at least 38 GiB"):
+        hibernating_cluster(ec2_service, stack, vpc, root_volume_size_gib=8)
+
+
+def test_hibernation_root_volume_of_an_unknown_instance_type(ec2_service, stack, vpc):
+    with pytest.raises(ValueError, match="root_volume_size_gib is required"):
+        hibernating_cluster(ec2_service, stack, vpc, instance_type="x9.large")
+
+
+def test_hibernation_root_volume_of_the_given_size(ec2_service, stack, vpc):
+    hibernating_cluster(ec2_service, stack, vpc, root_volume_size_gib=38)
+    assert root_volume_size(stack) == 38
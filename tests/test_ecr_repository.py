@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.fixture
+def ecr_repository(library):
+    return library("ecr_repository")
+
+
+@pytest.fixture
+def code_path(tmp_path):
+    (tmp_path / "Dockerfile").write_text("FROM scratch\n")
+    return tmp_path
+
+
+def test_duplicate_architectures_build_one_image(ecr_repository, library, stack, code_path):
+    Architecture = library("architecture").Architecture
+    repo = ecr_repository.ECRRepository(stack, "Repo", repository_name="app", code_path=code_path, image_tag="v1",
+                                        architectures=[Architecture.X86_64, Architecture.X86_64])
+
+    assert list(repo.image_assets) == [Architecture.X86_64]
+    assert repo.node.try_find_child("appDockerImage") is not None
+
+
+def test_architectures_must_not_be_empty(ecr_repository, stack, code_path):
+    with pytest.raises(ValueError, match="at least one architecture"):
+        ecr_repository.ECRRepository(stack, "Repo", repository_name="app", code_path=code_path, image_tag="v1",
+                                     architectures=[])
@@ -0,0 +1,126 @@
+import hashlib
+import json
+
+import pytest
+
+DOCKER_MANIFEST = "application/vnd.docker.distribution.manifest.v2+json"
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+
+
+class FakeEcr:
+    """Tags of one registry; PutImage of a tag that already points at the digest fails like ECR's."""
+
+    class exceptions:
+        class ImageAlreadyExistsException(Exception):
+            pass
+
+    def __init__(self):
+        self.images = dict()
+        self.put_calls = list()
+
+    def push(self, repository_name: str, tag: str, manifest: dict, media_type=None) -> str:
+        raw = json.dumps(manifest)
+        digest = "sha256:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        self.images[(repository_name, tag)] = {
+            "imageId": {"imageDigest": digest, "imageTag": tag},
+            "imageManifest": raw,
+            **({"imageManifestMediaType": media_type} if media_type else {})
+        }
+        return digest
+
+    def batch_get_image(self, repositoryName, imageIds, acceptedMediaTypes):
+        tag = imageIds[0]["imageTag"]
+        if (repositoryName, tag) in self.images:
+            return {"images": [self.images[(repositoryName, tag)]], "failures": []}
+        return {"images": [], "failures": [{"imageId": {"imageTag": tag}, "failureCode": "ImageNotFound"}]}
+
+    def put_image(self, repositoryName, imageManifest, imageManifestMediaType, imageTag, imageDigest):
+        self.put_calls.append(imageTag)
+        existing = self.images.get((repositoryName, imageTag))
+        if existing and existing["imageId"]["imageDigest"] == imageDigest:
+            raise self.exceptions.ImageAlreadyExistsException(imageTag)
+        self.images[(repositoryName, imageTag)] = {
+            "imageId": {"imageDigest": imageDigest, "imageTag": imageTag},
+            "imageManifest": imageManifest,
+            "imageManifestMediaType": imageManifestMediaType
+        }
+
+
+def image_manifest(media_type: str, layer: str) -> dict:
+    return {
+        "schemaVersion": 2,
+        "mediaType": media_type,
+        "config": {"mediaType": "application/vnd.docker.container.image.v1+json", "size": 1469,
+                   "digest": "sha256:" + hashlib.sha256(f"config-{layer}".encode()).hexdigest()},
+        "layers": [{"mediaType": "application/vnd.docker.image.rootfs.diff.tar.gzip", "size": 3208942,
+                    "digest": "sha256:" + hashlib.sha256(layer.encode()).hexdigest()}]
+    }
+
+
+@pytest.fixture(scope="module")
+def image_tags(load_handler):
+    return load_handler("image_tags")
+
+
+def test_single_architecture_is_retagged_as_is(image_tags):
+    ecr = FakeEcr()
+    digest = ecr.push("app", "abc123-x86_64", image_manifest(DOCKER_MANIFEST, "amd64"))
+
+    assert image_tags.tag_image(ecr, "app", [{"Tag": "abc123-x86_64", "Architecture": "amd64"}],
+                                ["v1", "latest"]) == digest
+    for tag in ("v1", "latest"):
+        image = ecr.images[("app", tag)]
+        assert image["imageId"]["imageDigest"] == digest
+        assert image["imageManifest"] == ecr.images[("app", "abc123-x86_64")]["imageManifest"]
+        assert image["imageManifestMediaType"] == DOCKER_MANIFEST
+
+
+def test_multi_architecture_index(image_tags):
+    ecr = FakeEcr()
+    amd64 = ecr.push("app", "abc123-x86_64", image_manifest(DOCKER_MANIFEST, "amd64"))
+    # buildx pushes OCI manifests; the media type may only be in the manifest itself
+    arm64 = ecr.push("app", "abc123-arm64", image_manifest(OCI_MANIFEST, "arm64"))
+
+    digest = image_tags.tag_image(ecr, "app", [{"Tag": "abc123-x86_64", "Architecture": "amd64"},
+                                               {"Tag": "abc123-arm64", "Architecture": "arm64"}], ["v1"])
+
+    image = ecr.images[("app", "v1")]
+    index = json.loads(image["imageManifest"])
+    assert image["imageManifestMediaType"] == image_tags.OCI_INDEX
+    assert index["mediaType"] == image_tags.OCI_INDEX
+    assert digest == "sha256:" + hashlib.sha256(image["imageManifest"].encode("utf-8")).hexdigest()
+    assert [(m["digest"], m["mediaType"], m["platform"]) for m in index["manifests"]] == [
+        (amd64, DOCKER_MANIFEST, {"architecture": "amd64", "os": "linux"}),
+        (arm64, OCI_MANIFEST, {"architecture": "arm64", "os": "linux"}),
+    ]
+    assert index["manifests"][1]["size"] == len(ecr.images[("app", "abc123-arm64")]["imageManifest"])
+
+
+def test_docker_only_children_make_a_manifest_list(image_tags):
+    ecr = FakeEcr()
+    ecr.push("app", "a", image_manifest(DOCKER_MANIFEST, "amd64"), media_type=DOCKER_MANIFEST)
+    ecr.push("app", "b", image_manifest(DOCKER_MANIFEST, "arm64"), media_type=DOCKER_MANIFEST)
+
+    image_tags.tag_image(ecr, "app", [{"Tag": "a", "Architecture": "amd64"}, {"Tag": "b", "Architecture": "arm64"}],
+                         ["v1"])
+
+    assert ecr.images[("app", "v1")]["imageManifestMediaType"] == image_tags.DOCKER_MANIFEST_LIST
+
+
+def test_put_image_is_idempotent(image_tags):
+    ecr = FakeEcr()
+    ecr.push("app", "a", image_manifest(DOCKER_MANIFEST, "amd64"))
+    ecr.push("app", "b", image_manifest(OCI_MANIFEST, "arm64"))
+    sources = [{"Tag": "a", "Architecture": "amd64"}, {"Tag": "b", "Architecture": "arm64"}]
+
+    first = image_tags.tag_image(ecr, "app", sources, ["v1"])
+    second = image_tags.tag_image(ecr, "app", sources, ["v1"])
+
+    assert first == second
+    assert ecr.put_calls == ["v1", "v1"]
+    assert ecr.images[("app", "v1")]["imageId"]["imageDigest"] == first
+
+
+def test_missing_source_tag(image_tags):
+    with pytest.raises(RuntimeError, match="app:missing not found"):
+        image_tags.tag_image(FakeEcr(), "app", [{"Tag": "missing", "Architecture": "amd64"}], ["v1"])
@@ -0,0 +1,151 @@
+import hashlib
+import json
+
+import pytest
+
+IMAGE_MANIFEST = {
+    "schemaVersion": 2,
+    "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+    "config": {
+        "mediaType": "application/vnd.docker.container.image.v1+json",
+        "size": 7023,
+        "digest": "sha256:b5b2b2c507a0944348e0303114d8d93aaaa081732b86451d9bce1f432a537bc7"
+    },
+    "layers": [
+        {
+            "mediaType": "application/vnd.docker.image.rootfs.diff.tar.gzip",
+            "size": 29124181,
+            "digest": "sha256:a2abf6c4d29d43a4bf9fbb769f524d0fb36a2edab49819c1bf3e76f409f953ea"
+        },
+        {
+            "mediaType": "application/vnd.docker.image.rootfs.diff.tar.gzip",
+            "size": 25584428,
+            "digest": "sha256:a9edb18cadd1336142d6567ebee31be2a03c0905eeefe26cb150de7b0fbc520b"
+        },
+        {
+            "mediaType": "application/vnd.docker.image.rootfs.diff.tar.gzip",
+            "size": 602,
+            "digest": "sha256:589b7251471a3d5fe4daccdddfefa02bdc32ffcba0a6d6a2768bf2c401faf115"
+        }
+    ]
+}
+
+# as pushed by `soci create` + `soci push`: one zTOC per layer above the minimum layer size,
+# the 602 byte layer is skipped
+SOCI_INDEX_MANIFEST = """{
+  "schemaVersion": 2,
+  "mediaType": "application/vnd.oci.image.manifest.v1+json",
+  "config": {
+    "mediaType": "application/vnd.amazon.soci.index.v1+json",
+    "digest": "sha256:44136fa355b3678a1146ad16f7e8649e94fb4fc21fe77e8310c060f61caaff8a",
+    "size": 2
+  },
+  "layers": [
+    {
+      "mediaType": "application/octet-stream",
+      "digest": "sha256:9fa7c5a0d4f1e2b3c6d8e7f0a1b2c3d4e5f60718293a4b5c6d7e8f9012345678",
+      "size": 2213432,
+      "annotations": {
+        "com.amazon.soci.image-layer-digest": "sha256:a2abf6c4d29d43a4bf9fbb769f524d0fb36a2edab49819c1bf3e76f409f953ea",
+        "com.amazon.soci.image-layer-mediatype": "application/vnd.docker.image.rootfs.diff.tar.gzip"
+      }
+    },
+    {
+      "mediaType": "application/octet-stream",
+      "digest": "sha256:1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d",
+      "size": 1877128,
+      "annotations": {
+        "com.amazon.soci.image-layer-digest": "sha256:a9edb18cadd1336142d6567ebee31be2a03c0905eeefe26cb150de7b0fbc520b",
+        "com.amazon.soci.image-layer-mediatype": "application/vnd.docker.image.rootfs.diff.tar.gzip"
+      }
+    }
+  ],
+  "subject": {
+    "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+    "digest": "%(subject_digest)s",
+    "size": %(subject_size)d
+  },
+  "annotations": {
+    "com.amazon.soci.build-tool-identifier": "AWS SOCI CLI v0.9.0"
+  }
+}"""
+
+
+class LocalRegistry:
+    """Dict backed stand-in for EcrRegistry."""
+
+    def __init__(self):
+        self.manifests = dict()
+
+    def put_manifest(self, repository_name: str, manifest: str) -> str:
+        digest = "sha256:" + hashlib.sha256(manifest.encode("utf-8")).hexdigest()
+        self.manifests[(repository_name, digest)] = manifest
+        return digest
+
+    def get_manifest(self, repository_name: str, digest: str) -> str:
+        try:
+            return self.manifests[(repository_name, digest)]
+        except KeyError:
+            raise RuntimeError(f"manifest {repository_name}@{digest} not found")
+
+
+class FakeEcr:
+    def __init__(self, images):
+        self.images = images
+
+    def batch_get_image(self, repositoryName, imageIds, acceptedMediaTypes):
+        digest = imageIds[0]["imageDigest"]
+        if (repositoryName, digest) in self.images:
+            return {"images": [{"imageManifest": self.images[(repositoryName, digest)]}], "failures": []}
+        return {"images": [], "failures": [{"imageId": {"imageDigest": digest}, "failureCode": "ImageNotFound"}]}
+
+
+@pytest.fixture(scope="module")
+def soci_index(load_handler):
+    return load_handler("soci_index")
+
+
+def put_image_and_index(registry, repository_name):
+    raw_image = json.dumps(IMAGE_MANIFEST)
+    image_digest = registry.put_manifest(repository_name, raw_image)
+    raw_index = SOCI_INDEX_MANIFEST % {"subject_digest": image_digest, "subject_size": len(raw_image)}
+    return raw_index, registry.put_manifest(repository_name, raw_index)
+
+
+def test_summarize_indexes_counts_covered_layers(soci_index):
+    registry = LocalRegistry()
+    raw_index, index_digest = put_image_and_index(registry, "app")
+
+    summary = soci_index.summarize_indexes(registry, "app", [index_digest])
+
+    assert summary["IndexDigests"] == index_digest
+    assert summary["IndexedLayers"] == "2/3"
+    assert summary["LayerCoverage"] == f"{(29124181 + 25584428) / (29124181 + 25584428 + 602):.2f}"
+    assert summary["IndexSizeBytes"] == str(len(raw_index) + 2213432 + 1877128)
+
+
+def test_summarize_indexes_without_layers(soci_index):
+    registry = LocalRegistry()
+    image_digest = registry.put_manifest("app", json.dumps({**IMAGE_MANIFEST, "layers": []}))
+    index_digest = registry.put_manifest("app", json.dumps({"layers": [], "subject": {"digest": image_digest}}))
+
+    summary = soci_index.summarize_indexes(registry, "app", [index_digest])
+
+    assert summary["IndexedLayers"] == "0/0"
+    assert summary["LayerCoverage"] == "0.00"
+
+
+def test_summarize_indexes_missing_subject(soci_index):
+    registry = LocalRegistry()
+    index_digest = registry.put_manifest("app", json.dumps({"layers": [], "subject": {"digest": "sha256:gone"}}))
+
+    with pytest.raises(RuntimeError, match="app@sha256:gone"):
+        soci_index.summarize_indexes(registry, "app", [index_digest])
+
+
+def test_ecr_registry_reads_manifests_by_digest(soci_index):
+    registry = soci_index.EcrRegistry(FakeEcr({("app", "sha256:abc"): "{}"}))
+
+    assert registry.get_manifest("app", "sha256:abc") == "{}"
+    with pytest.raises(RuntimeError, match="app@sha256:missing not found"):
+        registry.get_manifest("app", "sha256:missing")
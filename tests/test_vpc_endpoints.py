@@ -0,0 +1,28 @@
+import pytest
+from aws_cdk import aws_ec2 as ec2
+
+
+@pytest.fixture
+def vpc_endpoints(library):
+    return library("vpc_endpoints")
+
+
+def test_every_caller_gets_the_same_endpoints(vpc_endpoints, vpc):
+    subnets = ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS)
+    first = vpc_endpoints.ServiceEndpoints.of(vpc, subnets=subnets, ecs_agent=True)
+    second = vpc_endpoints.ServiceEndpoints.of(vpc, subnets=ec2.SubnetSelection(
+        subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS), ecs_agent=True)
+    assert first is second
+    assert "Ecs" in first.interface_endpoints
+
+
+def test_different_subnets_are_rejected(vpc_endpoints, vpc):
+    vpc_endpoints.ServiceEndpoints.of(vpc, subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS))
+    with pytest.raises(ValueError, match="already exist"):
+        vpc_endpoints.ServiceEndpoints.of(vpc, subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PUBLIC))
+
+
+def test_different_ecs_agent_setting_is_rejected(vpc_endpoints, vpc):
+    vpc_endpoints.ServiceEndpoints.of(vpc)
+    with pytest.raises(ValueError, match="ecs_agent=False"):
+        vpc_endpoints.ServiceEndpoints.of(vpc, ecs_agent=True)
@@ -0,0 +1,138 @@
+import base64
+import gzip
+import hashlib
+import os
+import re
+import shlex
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import jsii
+from aws_cdk import aws_ec2 as ec2
+from constructs import IValidation
+
+# EC2 rejects user data above 16 KB, counted before the base64 encoding of the API call
+MAX_USER_DATA_BYTES = 16 * 1024
+# with compress=None, scripts above this size are gzipped
+COMPRESS_ABOVE_BYTES = 8 * 1024
+
+ENV_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# file content by (path, mtime, size) and gzipped parts by content hash, shared by every
+# construct in the process; clusters and instances built from the same script read and
+# compress it once
+_FILE_CACHE: Dict[Tuple[str, int, int], str] = dict()
+_COMPRESSED_CACHE: Dict[str, str] = dict()
+
+
+def read_script(path: str) -> str:
+    path = os.path.realpath(os.path.expandvars(str(path)))
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _FILE_CACHE:
+        with open(path) as fp:
+            _FILE_CACHE[key] = fp.read()
+    return _FILE_CACHE[key]
+
+
+def export_commands(env: Mapping[str, str]) -> List[str]:
+    # the variable is set for the rest of the script and exported to login shells; values
+    # are quoted so spaces, quotes and $ reach the instance unchanged
+    commands = list()
+    for name, value in env.items():
+        if not ENV_NAME_PATTERN.match(name):
+            raise ValueError(f"invalid environment variable name {name!r}")
+        assignment = f"{name}={shlex.quote(str(value))}"
+        commands.append(assignment)
+        commands.append(f"echo {shlex.quote(f'export {assignment}')} >> /etc/profile")
+    return commands
+
+
+def _gzip_base64(content: str, digest: str) -> str:
+    if digest not in _COMPRESSED_CACHE:
+        # a fixed mtime keeps the output, and with it the template, stable between synths
+        _COMPRESSED_CACHE[digest] = base64.b64encode(gzip.compress(content.encode(), mtime=0)).decode()
+    return _COMPRESSED_CACHE[digest]
+
+
+class UserDataBuilder:
+    """Collects the user data of an instance as one script and renders it once.
+
+    The script is added to the user data in a single call. Boothooks and compression
+    switch to a multipart MIME document: boothooks first, then the script, gzipped when
+    compress is set (or, with compress=None, when it is larger than COMPRESS_ABOVE_BYTES),
+    and last the default shell part, which keeps taking the commands CDK adds later such as
+    the ECS cluster config. hash is the SHA-256 of everything rendered here.
+    """
+
+    def __init__(self, compress: Optional[bool] = None) -> None:
+        self.compress = compress
+        self.commands: List[str] = list()
+        self.boothooks: List[str] = list()
+
+    def add_commands(self, *commands: str) -> "UserDataBuilder":
+        self.commands.extend(commands)
+        return self
+
+    def add_env(self, env: Mapping[str, str]) -> "UserDataBuilder":
+        return self.add_commands(*export_commands(env))
+
+    def add_file(self, path: str) -> "UserDataBuilder":
+        return self.add_commands(read_script(path).rstrip("\n"))
+
+    def add_boothook(self, script: str) -> "UserDataBuilder":
+        self.boothooks.append(script)
+        return self
+
+    @property
+    def script(self) -> str:
+        return "\n".join(self.commands)
+
+    @property
+    def hash(self) -> str:
+        digest = hashlib.sha256()
+        for part in (*self.boothooks, self.script):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def build(self) -> ec2.UserData:
+        script = self.script
+        compress = self.compress if self.compress is not None else len(script.encode()) > COMPRESS_ABOVE_BYTES
+
+        shell = ec2.UserData.for_linux()
+        if script and not compress:
+            shell.add_commands(script)
+        if not (compress or self.boothooks):
+            return shell
+
+        multipart = ec2.MultipartUserData()
+        for boothook in self.boothooks:
+            multipart.add_part(ec2.MultipartBody.from_raw_body(content_type='text/cloud-boothook; charset="utf-8"',
+                                                               body=boothook))
+        if script and compress:
+            # cloud-init decompresses the part and runs it by its shebang
+            content = f"#!/bin/bash\n{script}\n"
+            multipart.add_part(ec2.MultipartBody.from_raw_body(content_type="application/x-gzip",
+                                                               transfer_encoding="base64",
+                                                               body=_gzip_base64(content, self.hash)))
+        multipart.add_user_data_part(shell, ec2.MultipartBody.SHELL_SCRIPT, True)
+        return multipart
+
+
+@jsii.implements(IValidation)
+class UserDataSizeCheck:
+    """Fails synth when the rendered user data exceeds MAX_USER_DATA_BYTES.
+
+    Runs at synth so commands added after construction are counted; unresolved tokens are
+    counted with the length of their placeholder.
+    """
+
+    def __init__(self, user_data: ec2.UserData) -> None:
+        self.user_data = user_data
+
+    def validate(self) -> List[str]:
+        size = len(self.user_data.render().encode())
+        if size > MAX_USER_DATA_BYTES:
+            return [f"user data is {size} bytes, EC2 accepts at most {MAX_USER_DATA_BYTES}; "
+                    "compress it or move the script to S3"]
+        return []
@@ -0,0 +1,79 @@
+from typing import Dict, Optional
+
+from aws_cdk import aws_ec2 as ec2
+from constructs import Construct, IConstruct
+
+HTTPS_PORT = 443
+
+# what a task needs to start without a NAT: pull from ECR (API, registry and the S3 bucket
+# holding the layers), ship logs and resolve secrets
+TASK_ENDPOINTS = {
+    "EcrApi": ec2.InterfaceVpcEndpointAwsService.ECR,
+    "EcrDkr": ec2.InterfaceVpcEndpointAwsService.ECR_DOCKER,
+    "Logs": ec2.InterfaceVpcEndpointAwsService.CLOUDWATCH_LOGS,
+    "SecretsManager": ec2.InterfaceVpcEndpointAwsService.SECRETS_MANAGER,
+}
+# the ECS agent on container instances registers and reports through these
+ECS_AGENT_ENDPOINTS = {
+    "Ecs": ec2.InterfaceVpcEndpointAwsService.ECS,
+    "EcsAgent": ec2.InterfaceVpcEndpointAwsService.ECS_AGENT,
+    "EcsTelemetry": ec2.InterfaceVpcEndpointAwsService.ECS_TELEMETRY,
+}
+
+
+class ServiceEndpoints(Construct):
+    def __init__(self, scope: Construct, id: str,
+                 vpc: ec2.IVpc,
+                 subnets: Optional[ec2.SubnetSelection] = None,
+                 ecs_agent: bool = False,
+                 additional_services: Optional[Dict[str, ec2.IInterfaceVpcEndpointService]] = None,
+                 **kwargs) -> None:
+        super().__init__(scope, id)
+        self.subnets = subnets
+        self.ecs_agent = ecs_agent
+
+        # one security group for every interface endpoint, open to the whole VPC on HTTPS
+        self.security_group = ec2.SecurityGroup(self, "SG",
+                                                vpc=vpc,
+                                                allow_all_outbound=False)
+        self.security_group.add_ingress_rule(peer=ec2.Peer.ipv4(vpc.vpc_cidr_block),
+                                             connection=ec2.Port.tcp(HTTPS_PORT))
+
+        # ECR serves image layers from S3; the gateway endpoint is free and only adds routes
+        self.s3_endpoint = ec2.GatewayVpcEndpoint(self, "S3",
+                                                  vpc=vpc,
+                                                  service=ec2.GatewayVpcEndpointAwsService.S3,
+                                                  subnets=[subnets] if subnets else None)
+
+        services = dict(TASK_ENDPOINTS)
+        if ecs_agent:
+            services.update(ECS_AGENT_ENDPOINTS)
+        services.update(additional_services or {})
+
+        self.interface_endpoints = dict()
+        for name, service in services.items():
+            self.interface_endpoints[name] = ec2.InterfaceVpcEndpoint(self, name,
+                                                                      vpc=vpc,
+                                                                      service=service,
+                                                                      subnets=subnets,
+                                                                      security_groups=[self.security_group],
+                                                                      private_dns_enabled=True,
+                                                                      open=False)
+
+    @classmethod
+    def of(cls, vpc: ec2.IVpc,
+           subnets: Optional[ec2.SubnetSelection] = None,
+           ecs_agent: bool = False) -> "ServiceEndpoints":
+        # endpoints are per VPC, so they live under the VPC and every caller gets the same set
+        endpoints = vpc.node.try_find_child("ServiceEndpoints")
+        if endpoints is None:
+            endpoints = cls(vpc, "ServiceEndpoints", vpc=vpc, subnets=subnets, ecs_agent=ecs_agent)
+        elif (endpoints.subnets, endpoints.ecs_agent) != (subnets, ecs_agent):
+            raise ValueError(f"the VPC endpoints already exist with subnets={endpoints.subnets}, "
+                             f"ecs_agent={endpoints.ecs_agent}")
+        return endpoints
+
+    def add_dependents(self, *dependents: IConstruct) -> None:
+        # tasks and instances created before the endpoints would fail their first pulls
+        for dependent in dependents:
+            dependent.node.add_dependency(self)